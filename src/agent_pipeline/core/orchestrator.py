@@ -41,6 +41,8 @@ class PipelineResult(BaseModel):
     reasoning: str
     duration_seconds: float
     errors: List[str] = []
+    kelly_fraction: float = 0.0
+    expected_value: float = 0.0
 
 
 class PipelineOrchestrator:
@@ -130,7 +132,9 @@ class PipelineOrchestrator:
                 risk_level=advice_result.risk_assessment.overall_risk_level,
                 reasoning=advice_result.advice.reasoning,
                 duration_seconds=duration,
-                errors=errors
+                errors=errors,
+                kelly_fraction=prediction_result.kelly_fraction,
+                expected_value=prediction_result.expected_value
             )
             
         except asyncio.TimeoutError:
@@ -8,6 +8,13 @@ from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 import asyncio
 import logging
+import re
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional fast JSON encoder
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,6 +31,26 @@ Review scenarios and filter if needed. Keep at least 2 scenarios.
 Eliminate only if one has very low probability (<0.15) AND weak reasoning.
 """
 
+# Probability mentions inside scenario strings ("0.35", "35%") used to pre-screen
+# scenarios before asking the evaluator to eliminate any of them
+PROB_RE = re.compile(r"(?<![\d.])(0\.\d{1,3}|\d{1,2}(?:\.\d+)?%)")
+ELIMINATION_THRESHOLD = 0.15
+
+# Per-scenario report blocks
+SCENARIO_TEMPLATE = """
+### Scenario {i}: {title}
+**Probability:** {probability:.1%}  
+**Confidence:** {confidence:.1f}/1.0  
+
+**Description:** {summary}
+
+**Supporting Evidence:** {evidence}
+
+**Research Findings:**
+"""
+
+RESEARCH_QA_TEMPLATE = "- **Q:** {question}\n  **A:** {answer}\n\n"
+
 ENRICHMENT_PROMPT = """
 Generate 2-3 research questions to validate this scenario.
 Focus on current data, trends, and expert opinions.
@@ -88,6 +115,12 @@ class EnrichedScenarioAnalysis(BaseModel):
     
     # Full Report
     full_report: str = Field(description="Complete formatted analysis report")
+    
+    def to_json_bytes(self) -> bytes:
+        """Serialize to UTF-8 JSON bytes, using orjson when available."""
+        if orjson is not None:
+            return orjson.dumps(self.model_dump(mode='json'))
+        return self.model_dump_json().encode('utf-8')
 
 
 class WebResearchAgent:
@@ -500,7 +533,14 @@ Consider the question type, time sensitivity, current date context, and whether
     
     async def _evaluate_and_filter_scenarios(self, scenarios: List[str]) -> List[str]:
         """Filter scenarios using string-based evaluation."""
-        if len(scenarios) <= 2:
+        if len(scenarios) <= 3:
+            logger.debug(f"Scenario evaluation skipped: only {len(scenarios)} scenarios")
+            return scenarios
+        
+        # The evaluator only eliminates scenarios below the probability threshold,
+        # so skip the LLM round-trip when none of them can qualify
+        if not any(self._scenario_below_threshold(s) for s in scenarios):
+            logger.debug(f"Scenario evaluation skipped: no scenario below {ELIMINATION_THRESHOLD:.0%}")
             return scenarios
         
         scenarios_summary = "\n".join([f"- {scenario}" for scenario in scenarios])
@@ -529,6 +569,15 @@ Consider the question type, time sensitivity, current date context, and whether
         
         return filtered_scenarios if filtered_scenarios else scenarios  # Fallback
     
+    @staticmethod
+    def _scenario_below_threshold(scenario: str) -> bool:
+        """Check whether any probability mentioned in the scenario is below the elimination threshold."""
+        for match in PROB_RE.findall(scenario):
+            probability = float(match[:-1]) / 100 if match.endswith('%') else float(match)
+            if probability < ELIMINATION_THRESHOLD:
+                return True
+        return False
+    
     async def _enrich_scenarios_parallel(self, scenarios: List[str], research_depth: str, use_web_research: bool = False) -> List[Dict[str, Any]]:
         """Enrich scenarios with research data."""
         enrichment_tasks = [
@@ -679,20 +728,21 @@ established trends, and logical reasoning based on available context.
         """Generate a comprehensive formatted report with all scenario details."""
         
         historical_marker = " (HISTORICAL ANALYSIS)" if actual_outcome else ""
+        parts: List[str] = []
         
-        report = f"""
+        parts.append(f"""
 # SCENARIO ANALYSIS REPORT{historical_marker}
 **Question:** {market_question}
-**Analysis Date:** {datetime.now().strftime("%Y-%m-%d %H:%M UTC")}
+**Analysis Date:** {time.strftime("%Y-%m-%d %H:%M UTC")}
 **Methodology:** Multi-scenario analysis with {"web research" if any(s.get("web_research_used") for s in enriched_scenarios) else "knowledge-based analysis"}
-"""
+""")
         
         if actual_outcome:
-            report += f"""**Analysis Type:** Retrospective analysis of past event
+            parts.append(f"""**Analysis Type:** Retrospective analysis of past event
 **Actual Outcome:** {actual_outcome}
-"""
+""")
         
-        report += f"""
+        parts.append(f"""
 ---
 
 ## EXECUTIVE SUMMARY
@@ -702,68 +752,65 @@ established trends, and logical reasoning based on available context.
 **Primary Conclusion:** {analysis.primary_conclusion}
 
 **Overall Assessment:** {analysis.overall_assessment}
-"""
+""")
         
         if actual_outcome and analysis.prediction_accuracy:
-            report += f"""
+            parts.append(f"""
 **Prediction Accuracy:** {analysis.prediction_accuracy}
-"""
+""")
         
-        report += """
+        parts.append("""
 ---
 
 ## DETAILED SCENARIO ANALYSIS
 
-"""
+""")
         
-        # Add each scenario with research details
-        for i, (scenario_summary, probability, confidence, evidence) in enumerate(
-            zip(analysis.scenario_summaries, analysis.final_probabilities, 
-                analysis.confidence_scores, analysis.scenario_evidence), 1
+        # Add each scenario with its research details, rendered once per scenario
+        titles = [
+            summary.split('(', 1)[0].strip() if '(' in summary else f'Scenario {i}'
+            for i, summary in enumerate(analysis.scenario_summaries, 1)
+        ]
+        qa_blocks = [
+            "".join(
+                RESEARCH_QA_TEMPLATE.format(question=question, answer=result[:200] + ('...' if len(result) > 200 else ''))
+                for question, result in enriched['research_results'].items()
+            )
+            for enriched in enriched_scenarios
+        ]
+        qa_blocks.extend([""] * (len(titles) - len(qa_blocks)))
+        
+        for i, (title, scenario_summary, probability, confidence, evidence, qa_block) in enumerate(
+            zip(titles, analysis.scenario_summaries, analysis.final_probabilities, 
+                analysis.confidence_scores, analysis.scenario_evidence, qa_blocks), 1
         ):
-            report += f"""
-                ### Scenario {i}: {scenario_summary.split('(')[0].strip() if '(' in scenario_summary else f'Scenario {i}'}
-                **Probability:** {probability:.1%}  
-                **Confidence:** {confidence:.1f}/1.0  
-
-                **Description:** {scenario_summary}
-
-                **Supporting Evidence:** {evidence}
-
-                **Research Findings:**
-            """
-            
-            # Add research questions and results for this scenario
-            if i <= len(enriched_scenarios):
-                enriched = enriched_scenarios[i-1]
-                for question, result in enriched['research_results'].items():
-                    report += f"- **Q:** {question}\n"
-                    report += f"  **A:** {result[:200]}{'...' if len(result) > 200 else ''}\n\n"
-        
-        report += f"""
+            parts.append(SCENARIO_TEMPLATE.format(
+                i=i, title=title, probability=probability, confidence=confidence,
+                summary=scenario_summary, evidence=evidence
+            ))
+            parts.append(qa_block)
+        
+        parts.append("""
 ---
 
 ## KEY INSIGHTS
 
-"""
-        for insight in analysis.key_insights:
-            report += f"• {insight}\n"
+""")
+        parts.extend(f"• {insight}\n" for insight in analysis.key_insights)
         
         if analysis.contrarian_perspectives:
-            report += f"""
+            parts.append("""
 ### Contrarian Perspectives
-"""
-            for perspective in analysis.contrarian_perspectives:
-                report += f"• {perspective}\n"
+""")
+            parts.extend(f"• {perspective}\n" for perspective in analysis.contrarian_perspectives)
         
         if analysis.risk_factors:
-            report += f"""
+            parts.append("""
 ### Risk Factors
-"""
-            for risk in analysis.risk_factors:
-                report += f"• {risk}\n"
+""")
+            parts.extend(f"• {risk}\n" for risk in analysis.risk_factors)
         
-        report += f"""
+        parts.append(f"""
 ---
 
 ## DECISION FRAMEWORK
@@ -771,11 +818,10 @@ established trends, and logical reasoning based on available context.
 {analysis.decision_framework}
 
 ### Strategic Implications
-"""
-        for implication in analysis.strategic_implications:
-            report += f"• {implication}\n"
+""")
+        parts.extend(f"• {implication}\n" for implication in analysis.strategic_implications)
         
-        report += f"""
+        parts.append(f"""
 ### Contingency Planning
 {analysis.contingency_planning}
 
@@ -784,19 +830,17 @@ established trends, and logical reasoning based on available context.
 ## MONITORING FRAMEWORK
 
 ### Key Indicators to Track
-"""
-        for indicator in analysis.key_indicators:
-            report += f"• {indicator}\n"
+""")
+        parts.extend(f"• {indicator}\n" for indicator in analysis.key_indicators)
         
-        report += f"""
+        parts.append("""
 ### Early Warning Signs
-"""
-        for warning in analysis.early_warning_signs:
-            report += f"• {warning}\n"
+""")
+        parts.extend(f"• {warning}\n" for warning in analysis.early_warning_signs)
         
         # Add historical analysis section if applicable
         if actual_outcome:
-            report += f"""
+            parts.append(f"""
 ---
 
 ## HISTORICAL ANALYSIS
@@ -804,17 +848,16 @@ established trends, and logical reasoning based on available context.
 ### Prediction vs Reality
 **What Actually Happened:** {actual_outcome}
 
-"""
+""")
             if analysis.prediction_accuracy:
-                report += f"**Accuracy Assessment:** {analysis.prediction_accuracy}\n\n"
+                parts.append(f"**Accuracy Assessment:** {analysis.prediction_accuracy}\n\n")
             
             if analysis.lessons_learned:
-                report += "### Lessons Learned\n"
-                for lesson in analysis.lessons_learned:
-                    report += f"• {lesson}\n"
-                report += "\n"
+                parts.append("### Lessons Learned\n")
+                parts.extend(f"• {lesson}\n" for lesson in analysis.lessons_learned)
+                parts.append("\n")
         
-        report += f"""
+        parts.append(f"""
 ---
 
 ## METHODOLOGY NOTES
@@ -823,16 +866,16 @@ established trends, and logical reasoning based on available context.
 **Research Enrichment:** {"WebSearchTool for current data" if any(s.get("web_research_used") for s in enriched_scenarios) else "Knowledge-based analysis"}
 **Probability Calibration:** Evidence-weighted estimation with confidence scoring
 **Analysis Framework:** Multi-factor analysis adapted to question type
-"""
+""")
         
         if actual_outcome:
-            report += "**Historical Analysis:** Retrospective comparison of predictions with actual outcomes\n"
+            parts.append("**Historical Analysis:** Retrospective comparison of predictions with actual outcomes\n")
         
-        report += """
+        parts.append("""
 *This analysis is for informational purposes only and represents a structured approach to scenario planning.*
-"""
+""")
         
-        return report.strip()
+        return "".join(parts).strip()
     
     def save_report(self, analysis: EnrichedScenarioAnalysis, filename: str = None) -> str:
         """Save the formatted report to a file."""
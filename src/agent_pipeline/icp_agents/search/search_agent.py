@@ -1,13 +1,17 @@
 from agents import Agent, function_tool, Runner, trace
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 from tavily import AsyncTavilyClient
 import asyncio
-import statistics
+import hashlib
 import logging
+import time
+import weakref
+import numpy as np
 from agent_pipeline.config.env_config import config
 from agent_pipeline.utils.simple_cache import cached
+from agent_pipeline.utils.prompt_cache import prompt_cache
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -78,6 +82,75 @@ Focus on creating a report that provides genuine value to investors and decision
 """
 
 
+# Parallélisme Tavily et arrêt anticipé de la recherche
+MAX_CONCURRENT_SEARCHES = 4
+QUALITY_SOURCES_TARGET = 12
+
+# Contenu conservé par résultat Tavily (le formatage n'en affiche que 500 caractères)
+MAX_RESULT_CONTENT_CHARS = 512
+
+
+# Client Tavily partagé (pool de connexions HTTP réutilisé entre les SearchAgent)
+_tavily_client: Optional[AsyncTavilyClient] = None
+_tavily_client_api_key: Optional[str] = None
+# Référence faible vers la boucle du client : un id() peut être réattribué
+# à une nouvelle boucle après un asyncio.run() précédent
+_tavily_client_loop: Optional["weakref.ref[asyncio.AbstractEventLoop]"] = None
+_tavily_close_tasks: "set[asyncio.Task]" = set()
+
+
+async def _close_tavily_client(client: AsyncTavilyClient) -> None:
+    """Close a replaced Tavily client, ignoring transports bound to a closed loop."""
+    try:
+        await client.close()
+    except Exception as e:
+        logger.debug(f"Could not close replaced Tavily client: {e}")
+
+
+def _retire_tavily_client(client: AsyncTavilyClient, old_loop: Optional[asyncio.AbstractEventLoop],
+                          loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Schedule the close of a replaced client on whichever loop can still run it."""
+    if old_loop is not None and old_loop is not loop and old_loop.is_running():
+        asyncio.run_coroutine_threadsafe(_close_tavily_client(client), old_loop)
+    elif loop is not None:
+        task = loop.create_task(_close_tavily_client(client))
+        _tavily_close_tasks.add(task)
+        task.add_done_callback(_tavily_close_tasks.discard)
+    else:
+        asyncio.run(_close_tavily_client(client))
+
+
+def _get_tavily_client(api_key: str) -> AsyncTavilyClient:
+    """Return the shared Tavily client, rebuilt when the API key or event loop changes."""
+    global _tavily_client, _tavily_client_api_key, _tavily_client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    # Les connexions httpx sont liées à la boucle qui les a ouvertes
+    old_loop = _tavily_client_loop() if _tavily_client_loop is not None else None
+    same_loop = (old_loop is not None and old_loop is loop) if _tavily_client_loop is not None else loop is None
+    if _tavily_client is not None and _tavily_client_api_key == api_key and same_loop:
+        return _tavily_client
+    if _tavily_client is not None:
+        _retire_tavily_client(_tavily_client, old_loop, loop)
+    _tavily_client = AsyncTavilyClient(api_key)
+    _tavily_client_api_key = api_key
+    _tavily_client_loop = weakref.ref(loop) if loop is not None else None
+    return _tavily_client
+
+
+def _score_filter(scores: np.ndarray, limit: int) -> Tuple[float, np.ndarray]:
+    """Adaptive threshold (at least 80% of the median score) and indices of the first `limit` results above it."""
+    threshold = max(0.5, float(np.median(scores)) * 0.8)
+    return threshold, np.flatnonzero(scores[:limit] >= threshold)
+
+
+def _normalize_query(query: str) -> str:
+    """Normalize a search query (case, whitespace, max 400 characters)."""
+    return " ".join(query.lower().split())[:400]
+
+
 # Modèles Pydantic pour structured outputs
 class SubQueries(BaseModel):
     queries: List[str]
@@ -99,7 +172,13 @@ class SearchAgent:
         api_key = config.tavily_api_key
         if not api_key:
             raise ValueError("TAVILY_API_KEY environment variable is required") 
-        self.tavily_client = AsyncTavilyClient(api_key)
+        self.tavily_client = _get_tavily_client(api_key)
+        self.console = None
+        self._research_steps: List[str] = []
+        self.prompt_cache = prompt_cache
+        # Derniers prompts construits, réutilisés tant que les résultats sont identiques
+        self._synthesis_prompt_memo: Tuple[Optional[tuple], str] = (None, "")
+        self._decision_prompt_memo: Tuple[Optional[tuple], str] = (None, "")
 
         self.sub_query_agent = Agent(
             name="SubQueryAgent",
@@ -121,170 +200,233 @@ class SearchAgent:
             model="gpt-4.1-mini"
         )
 
-    async def generate_subqueries(self, main_query: str) -> SubQueries:
+    async def generate_subqueries(self, main_query: str, current_time: Optional[str] = None) -> SubQueries:
         """Generate sub-questions from the main question."""
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        subqueries_result = await Runner.run(
+        if current_time is None:
+            current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        return await self.prompt_cache.get_or_run(
             self.sub_query_agent,
-            input=f"Main question: {main_query} \nCurrent time: {current_time}"
+            f"Main question: {main_query} \nCurrent time: {current_time}",
+            key_text=main_query
         )
-        return subqueries_result.final_output
 
     async def perform_research(self, subqueries: List[str]) -> SearchResults:
         """Perform research for each sub-question and collect results with async parallelization."""
         
+        # Limite le nombre de requêtes Tavily simultanées (rate limits)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+        
         @cached(ttl_seconds=1800)  # Cache for 30 minutes
-        async def _safe_search(query: str) -> dict:
+        async def _safe_search(normalized_query: str) -> dict:
             """Perform a single search with error handling and retry logic."""
-            # Limiter la longueur des requêtes (max 400 caractères)
-            trimmed_query = query[:400] if len(query) > 400 else query
-            
             # Déterminer les paramètres adaptés selon le type de requête
-            search_params = self._get_search_parameters(query)
+            search_params = self._get_search_parameters(normalized_query)
             
-            for attempt in range(3):  # Retry logic
-                try:
-                    response = await self.tavily_client.search(
-                        trimmed_query,
-                        max_results=10,
-                        include_answer=True,
-                        auto_parameters=True,  # Tuning automatique BETA
-                        **search_params
-                    )
-                    return {"query": query, "response": response, "success": True}
-                except Exception as e:
-                    logger.warning(f"Attempt {attempt + 1} failed for query '{query[:50]}...': {e}")
-                    if attempt < 2:  # Back-off exponential
-                        await asyncio.sleep(2 ** attempt)
-                    else:
-                        logger.error(f"All attempts failed for query '{query[:50]}...': {str(e)}")
-                        return {"query": query, "response": None, "success": False, "error": str(e)}
+            async with semaphore:
+                for attempt in range(3):  # Retry logic
+                    try:
+                        response = await self.tavily_client.search(
+                            normalized_query,
+                            max_results=10,
+                            include_answer=True,
+                            auto_parameters=True,  # Tuning automatique BETA
+                            **search_params
+                        )
+                        # Tronquer avant mise en cache : seul le début du contenu est utilisé
+                        for result in response.get('results', ()):
+                            result.pop('raw_content', None)
+                            content = result.get('content')
+                            if content and len(content) > MAX_RESULT_CONTENT_CHARS:
+                                result['content'] = content[:MAX_RESULT_CONTENT_CHARS]
+                        return {"response": response, "success": True}
+                    except Exception as e:
+                        logger.warning(f"Attempt {attempt + 1} failed for query '{normalized_query[:50]}...': {e}")
+                        if attempt < 2:  # Back-off exponential
+                            await asyncio.sleep(2 ** attempt)
+                        else:
+                            logger.error(f"All attempts failed for query '{normalized_query[:50]}...': {str(e)}")
+                            return {"response": None, "success": False, "error": str(e)}
+        
+        async def _search(query: str) -> dict:
+            """Search on the normalized query so case/whitespace variants share a cache entry."""
+            result = await _safe_search(_normalize_query(query))
+            return {**result, "query": query}
+        
+        async def _indexed_search(index: int, query: str) -> tuple:
+            return index, await _search(query)
         
         # Exécution parallèle des recherches
         logger.info(f"Processing {len(subqueries)} sub-queries in parallel...")
-        tasks = [_safe_search(query) for query in subqueries]
-        raw_results = await asyncio.gather(*tasks)
+        tasks = [asyncio.create_task(_indexed_search(i, query)) for i, query in enumerate(subqueries)]
         
-        # Traitement des résultats
-        search_results = []
-        for result in raw_results:
-            if result["success"] and result["response"]:
-                formatted_result = self._format_tavily_response(result["query"], result["response"])
-                search_results.append(formatted_result)
-            else:
-                logger.warning(f"Failed to process query: {result['query'][:50]}...")
+        # Traitement des résultats au fil de l'eau, arrêt anticipé une fois assez de sources de qualité
+        formatted_results = {}
+        quality_sources = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                index, result = await next_result
+                if result["success"] and result["response"]:
+                    # Formatage hors de la boucle d'événements pour ne pas retarder les autres recherches
+                    formatted_result, quality_count = await asyncio.to_thread(
+                        self._format_tavily_response, result["query"], result["response"]
+                    )
+                    formatted_results[index] = formatted_result
+                    quality_sources += quality_count
+                else:
+                    logger.warning(f"Failed to process query: {result['query'][:50]}...")
+                
+                if quality_sources >= QUALITY_SOURCES_TARGET:
+                    logger.info(f"Found {quality_sources} quality sources, cancelling remaining searches")
+                    break
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
         results = SearchResults(
             main_query=self.question,
-            search_results=search_results,
+            search_results=[formatted_results[i] for i in sorted(formatted_results)],
         )
 
         return results
 
+    # Mots-clés précalculés pour le choix des paramètres de recherche
+    _RECENT_KW = frozenset({"latest", "recent", "current", "today", "2025", "trends"})
+    _ANALYSIS_KW = frozenset({"analysis", "detailed", "comprehensive", "in-depth"})
+
     def _get_search_parameters(self, query: str) -> dict:
         """Déterminer les paramètres optimaux selon le type de requête."""
         params = {}
+        tokens = {token.strip(".,;:!?()[]\"'") for token in query.lower().split()}
         
         # Requêtes récentes/actuelles
-        recent_keywords = ["latest", "recent", "current", "today", "2025", "trends"]
-        if any(keyword in query.lower() for keyword in recent_keywords):
+        if tokens & self._RECENT_KW:
             params.update({
                 "topic": "news",
                 "search_depth": "advanced"
             })
         
-        # Requêtes d'analyse approfondie
-        analysis_keywords = ["analysis", "detailed", "comprehensive", "in-depth"]
-        if any(keyword in query.lower() for keyword in analysis_keywords):
+        # Requêtes d'analyse approfondie (raw_content non demandé : jamais exploité)
+        if tokens & self._ANALYSIS_KW:
             params.update({
-                "search_depth": "advanced",
-                "include_raw_content": True
+                "search_depth": "advanced"
             })
         
         return params
 
-    def _format_tavily_response(self, query: str, response: dict) -> str:
-        """Format Tavily response to extract key information with adaptive filtering."""
-        formatted = f"Query: {query}\n\n"
+    def _format_tavily_response(self, query: str, response: dict) -> Tuple[str, int]:
+        """
+        Format Tavily response to extract key information with adaptive filtering.
+        Returns the formatted text and the number of quality sources kept.
+        """
+        parts = [f"Query: {query}\n\n"]
+        quality_count = 0
         
         # Add answer if available
         if response.get('answer'):
-            formatted += f"Summary: {response['answer']}\n\n"
+            parts.append(f"Summary: {response['answer']}\n\n")
         
         # Add detailed results with adaptive scoring
-        if response.get('results'):
-            # Calcul du seuil adaptatif
-            scores = [result.get('score', 0) for result in response['results']]
-            if scores:
-                median_score = statistics.median(scores)
-                adaptive_threshold = max(0.5, median_score * 0.8)  # Au moins 80% du score médian
-            else:
-                adaptive_threshold = 0.7  # Fallback
+        results = response.get('results')
+        if results:
+            # Seuil adaptatif et filtrage des 8 premiers résultats
+            scores = np.fromiter((result.get('score', 0) for result in results), dtype=np.float64, count=len(results))
+            adaptive_threshold, quality_indices = _score_filter(scores, 8)
             
-            formatted += f"Detailed Sources (threshold: {adaptive_threshold:.2f}):\n"
-            quality_results = []
-            
-            for i, result in enumerate(response['results'][:8], 1):  # Limite à 8 résultats
-                title = result.get('title', 'No title')
-                url = result.get('url', 'No URL')
-                content = result.get('content', 'No content')
-                score = result.get('score', 0)
-                
-                # Filtrage adaptatif basé sur le score
-                if score >= adaptive_threshold:
-                    quality_results.append({
-                        'title': title,
-                        'url': url,
-                        'content': content[:500],
-                        'score': score
-                    })
+            parts.append(f"Detailed Sources (threshold: {adaptive_threshold:.2f}):\n")
             
             # Formatage des résultats de qualité
-            for i, result in enumerate(quality_results, 1):
-                formatted += f"[{i}] Title: {result['title']}\n"
-                formatted += f"    URL: {result['url']}\n"
-                formatted += f"    Content: {result['content']}...\n"
-                formatted += f"    Relevance Score: {result['score']:.3f}\n\n"
+            for i, index in enumerate(quality_indices, 1):
+                result = results[index]
+                parts.append(f"[{i}] Title: {result.get('title', 'No title')}\n")
+                parts.append(f"    URL: {result.get('url', 'No URL')}\n")
+                parts.append(f"    Content: {result.get('content', 'No content')[:500]}...\n")
+                parts.append(f"    Relevance Score: {scores[index]:.3f}\n\n")
             
-            formatted += f"Quality sources found: {len(quality_results)}/{len(response['results'])}\n"
+            quality_count = len(quality_indices)
+            parts.append(f"Quality sources found: {quality_count}/{len(results)}\n")
             
             # Métriques de performance
             if 'response_time' in response:
-                formatted += f"Response time: {response['response_time']}ms\n"
+                parts.append(f"Response time: {response['response_time']}ms\n")
         
-        return formatted
+        return "".join(parts), quality_count
+
+    @staticmethod
+    def _results_digest(search_results: List[str]) -> bytes:
+        """Content hash of the search results, used to key prompts built from them."""
+        return hashlib.blake2b("\x00".join(search_results).encode(), digest_size=16).digest()
 
-    async def synthesize_report(self, main_query: str, search_results: List[str]) -> str:
+    async def synthesize_report(self, main_query: str, search_results: List[str], timestamp: Optional[str] = None) -> str:
         """Synthesize research results into a complete report."""
-        # Validate and enrich search results before synthesis
-        enriched_results = self._enrich_search_results(search_results)
+        if timestamp is None:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        digest = self._results_digest(search_results)
+        
+        # Validate and enrich search results before synthesis (reused on retries)
+        prompt_key = (main_query, digest, timestamp)
+        if self._synthesis_prompt_memo[0] == prompt_key:
+            synthesis_input = self._synthesis_prompt_memo[1]
+        else:
+            enriched_results = await asyncio.to_thread(self._enrich_search_results, search_results, timestamp)
+            synthesis_input = f"Main query: {main_query}\nEnriched search results: {enriched_results}"
+            self._synthesis_prompt_memo = (prompt_key, synthesis_input)
         
-        synthesis_input = f"Main query: {main_query}\nEnriched search results: {enriched_results}"
-        synthesis_result = await Runner.run(
+        # Long-form output: exact matches only, keyed without the research timestamp
+        return await self.prompt_cache.get_or_run(
             self.synthesis_agent,
-            input=synthesis_input
+            synthesis_input,
+            key_text=f"{main_query}\n{digest.hex()}"
         )
-        return synthesis_result.final_output
 
-    def _enrich_search_results(self, search_results: List[str]) -> str:
+    def _enrich_search_results(self, search_results: List[str], timestamp: Optional[str] = None) -> str:
         """Enrich search results with metadata and quality indicators."""
-        enriched = "=== RESEARCH FINDINGS ===\n\n"
+        if timestamp is None:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        parts = ["=== RESEARCH FINDINGS ===\n\n"]
         
         for i, result in enumerate(search_results, 1):
-            enriched += f"## Research Finding #{i}\n"
-            enriched += f"{result}\n"
-            enriched += "---\n\n"
+            parts.extend((f"## Research Finding #{i}\n", result, "\n---\n\n"))
         
         # Add metadata about the research process
-        enriched += f"=== RESEARCH METADATA ===\n"
-        enriched += f"Total queries processed: {len(search_results)}\n"
-        enriched += f"Research timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        enriched += f"Research depth: Multi-iteration with follow-up queries\n"
-        enriched += f"API: Tavily (Async + Auto-parameters)\n"
-        enriched += f"Quality filtering: Adaptive threshold\n"
-        enriched += f"Parallelization: Enabled\n\n"
+        parts.append(
+            "=== RESEARCH METADATA ===\n"
+            f"Total queries processed: {len(search_results)}\n"
+            f"Research timestamp: {timestamp}\n"
+            "Research depth: Multi-iteration with follow-up queries\n"
+            "API: Tavily (Async + Auto-parameters)\n"
+            "Quality filtering: Adaptive threshold\n"
+            "Parallelization: Enabled\n\n"
+        )
+        
+        return "".join(parts)
+
+    async def _decide_follow_up(self, main_query: str, current_time: str, search_results: List[str]) -> FollowUpDecisionResponse:
+        """Decide whether follow-up research is needed given the results so far."""
+        digest = self._results_digest(search_results)
+        
+        # Reuse the prompt verbatim when the results have not changed
+        prompt_key = (main_query, digest, current_time)
+        if self._decision_prompt_memo[0] == prompt_key:
+            decision_input = self._decision_prompt_memo[1]
+        else:
+            decision_input = f"Main query: {main_query}\nCurrent time: {current_time}\nSearch results so far: {search_results}"
+            self._decision_prompt_memo = (prompt_key, decision_input)
         
-        return enriched
+        return await self.prompt_cache.get_or_run(
+            self.follow_up_decision_agent,
+            decision_input,
+            # Exact matches only: results grow by appending, so near matches would
+            # replay the previous iteration's decision
+            key_text=f"{main_query}\n{digest.hex()}"
+        )
+
+    def _log_step(self, message: str) -> None:
+        """Show a research step on the console (if attached) and record it for the run summary."""
+        self._research_steps.append(message)
+        if self.console is not None:
+            self.console.print(f"[dim]→ {message}[/dim]")
 
     async def research(self, main_query: str) -> str:
         """
@@ -293,62 +435,59 @@ class SearchAgent:
         Stops after 3 follow-up iterations maximum.
         """
 
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._research_steps = []
+
         with trace("Deep Research Workflows"):
             # 1. Generate sub-questions
-            if hasattr(self, 'console'):
-                self.console.print("[dim]→ Generating specialized research sub-questions[/dim]")
-            subqueries = (await self.generate_subqueries(main_query)).queries
+            self._log_step("Generating specialized research sub-questions")
+            subqueries = (await self.generate_subqueries(main_query, current_time)).queries
 
             # 2. Perform research
-            if hasattr(self, 'console'):
-                self.console.print(f"[dim]→ Executing parallel research on {len(subqueries)} specialized queries[/dim]")
+            self._log_step(f"Executing parallel research on {len(subqueries)} specialized queries")
             initial_results = await self.perform_research(subqueries)
             all_search_results = initial_results.search_results
+            seen_queries = {_normalize_query(query) for query in subqueries}
 
             # 3. Decide if follow-up is needed (uses search_results, not report)
             iteration = 0
             max_iterations = 2
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            if hasattr(self, 'console'):
-                self.console.print("[dim]→ Evaluating need for follow-up research[/dim]")
-            follow_up_decision = await Runner.run(
-                self.follow_up_decision_agent,
-                input=f"Main query: {main_query}\nCurrent time: {current_time}\nSearch results so far: {all_search_results}"
-            )
-            follow_up_decision = follow_up_decision.final_output
-
-            while follow_up_decision.should_follow_up and iteration < max_iterations:
-                if hasattr(self, 'console'):
-                    self.console.print(f"[dim]→ Follow-up research needed (iteration {iteration + 1})[/dim]")
+
+            self._log_step("Evaluating need for follow-up research")
+
+            while iteration < max_iterations:
+                follow_up_decision = await self._decide_follow_up(main_query, current_time, all_search_results)
+                if not follow_up_decision.should_follow_up:
+                    break
+
+                self._log_step(f"Follow-up research needed (iteration {iteration + 1})")
                 logger.info(f"Follow-up needed: {follow_up_decision.reasoning}")
-                new_subqueries = follow_up_decision.queries
+                new_subqueries = []
+                for query in follow_up_decision.queries:
+                    normalized_query = _normalize_query(query)
+                    if normalized_query not in seen_queries:
+                        seen_queries.add(normalized_query)
+                        new_subqueries.append(query)
                 if not new_subqueries:
-                    logger.info("No follow-up queries generated, stopping.")
+                    logger.info("No new follow-up queries generated, stopping.")
                     break
 
                 # Perform research for new sub-questions
-                if hasattr(self, 'console'):
-                    self.console.print(f"[dim]→ Executing {len(new_subqueries)} targeted additional research queries[/dim]")
+                self._log_step(f"Executing {len(new_subqueries)} targeted additional research queries")
                 new_results = await self.perform_research(new_subqueries)
                 all_search_results.extend(new_results.search_results)
 
-                # Decide again if follow-up is needed (uses all_search_results)
-                follow_up_decision = await Runner.run(
-                    self.follow_up_decision_agent,
-                    input=f"Main query: {main_query}\nCurrent time: {current_time}\nSearch results so far: {all_search_results}"
-                )
-                follow_up_decision = follow_up_decision.final_output
-
+                # No decision needed once the iteration budget is spent (loop condition)
                 iteration += 1
 
-            # 4. Synthesize the report at the end, using all search results
-            if hasattr(self, 'console'):
-                self.console.print("[dim]→ Synthesizing and compiling comprehensive research report[/dim]")
-            report = await self.synthesize_report(main_query, all_search_results)
+            # 4. Synthesize the report once, at the end, using all search results
+            self._log_step("Synthesizing and compiling comprehensive research report")
+            report = await self.synthesize_report(main_query, all_search_results, current_time)
             
             # Note: Auto-save disabled to avoid unwanted files
 
+        logger.info("Research steps:\n" + "\n".join(f"  → {step}" for step in self._research_steps))
+
         return report
 
     async def _save_report(self, report: str, query: str) -> None:
@@ -3,12 +3,21 @@ ICP Canister Integration - Bridge between agent pipeline and ICP_hack canisters.
 """
 
 import asyncio
-from typing import Dict, Any, Optional, List
+import copy
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 import json
 import logging
 
-from agent_pipeline.core.orchestrator import PipelineOrchestrator, PipelineConfig
+try:
+    import orjson
+except ImportError:  # Optional fast JSON encoder
+    orjson = None
+
+from agent_pipeline.core.orchestrator import PipelineOrchestrator, PipelineConfig, PipelineResult
 from agent_pipeline.icp_agents.search import SearchAgent
 from agent_pipeline.icp_agents.analysis import AnalysisAgent, AnalysisResult
 from agent_pipeline.icp_agents.prediction import PredictionAgent, PredictionResult
@@ -16,6 +25,72 @@ from agent_pipeline.icp_agents.advice import AdviceAgent, MarketAdviceReport
 
 logger = logging.getLogger(__name__)
 
+# Insight cache: repeated requests for the same market within the TTL reuse the pipeline result
+INSIGHT_CACHE_TTL_SECONDS = 60
+INSIGHT_CACHE_MAX_ENTRIES = 256
+
+# Reasoning is truncated for canister storage
+CANISTER_REASONING_MAX_CHARS = 500
+
+# Constant parts of canister responses; always copied with {**template, ...}, never mutated
+_ERROR_PREDICTION = {"probability": 0.5, "confidence": "LOW", "recommendation": "INSUFFICIENT_DATA"}
+_VALIDATION_ERROR = {"is_valid": False, "validation_score": 0.0}
+_STATUS_TEMPLATE = {"canister_status": "active", "version": "1.0.0"}
+
+# Last formatted timestamp, refreshed at most once per second
+_iso_cache: Tuple[int, str] = (0, "")
+
+
+def _iso_now() -> str:
+    """Current local time as an ISO 8601 string (second precision)."""
+    global _iso_cache
+    now = int(time.time())
+    if now != _iso_cache[0]:
+        _iso_cache = (now, datetime.fromtimestamp(now).isoformat())
+    return _iso_cache[1]
+
+
+def _to_json_bytes(data: Dict[str, Any], indent: bool = False) -> bytes:
+    """Serialize a canister payload to UTF-8 JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(data, indent=2 if indent else None).encode('utf-8')
+
+
+def _build_insight_payload(
+    result: PipelineResult,
+    market_id: str,
+    current_price: Optional[float],
+    research_depth: str
+) -> Dict[str, Any]:
+    """Convert a pipeline result to the ICP canister insight format."""
+    return {
+        "market_id": market_id,
+        "generated_at": _iso_now(),
+        "ai_prediction": {
+            "probability": result.probability,
+            "confidence": result.confidence.upper(),
+            "recommendation": result.recommendation,
+            "reasoning": result.reasoning[:CANISTER_REASONING_MAX_CHARS],
+        },
+        "risk_assessment": {
+            "risk_level": result.risk_level,
+            "risk_factors": result.errors if result.errors else ["Standard market risks"]
+        },
+        "market_analysis": {
+            "kelly_fraction": result.kelly_fraction,
+            "expected_value": result.expected_value,
+            "market_price": current_price
+        },
+        "metadata": {
+            "research_depth": research_depth,
+            "processing_time": result.duration_seconds,
+            "agent_version": "1.0.0",
+            "success": result.success
+        }
+    }
+
+
 class ICPAgentCanister:
     """
     ICP Canister interface for AI agents.
@@ -31,13 +106,19 @@ class ICPAgentCanister:
         self.prediction_agent = None
         self.advice_agent = None
         
+        # (market_id, research_depth, price bucket) -> (created_at, insight)
+        self._insight_cache: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # (event loop, insight key) -> pipeline run shared by concurrent callers on that loop
+        self._insight_inflight: Dict[Tuple, asyncio.Future] = {}
+        
     async def initialize_agents(self) -> bool:
         """Initialize all agents for the canister."""
         try:
-            # Initialize agents lazily to avoid startup overhead
+            # Initialize agents lazily to avoid startup overhead: insights run through the
+            # orchestrator's own agents, and validate_market needs a SearchAgent per market title
             return True
         except Exception as e:
-            logger.error(f"Failed to initialize agents: {e}")
+            logger.error("Failed to initialize agents: %s", e)
             return False
     
     async def generate_insight(
@@ -61,8 +142,93 @@ class ICPAgentCanister:
         Returns:
             Dict containing AI insight with probability, confidence, reasoning, etc.
         """
+        insight = await self._get_insight(
+            market_id, market_title, market_description, current_price, research_depth
+        )
+        return copy.deepcopy(insight)
+    
+    async def generate_insight_bytes(
+        self, 
+        market_id: str, 
+        market_title: str, 
+        market_description: str,
+        current_price: Optional[float] = None,
+        research_depth: str = "standard"
+    ) -> bytes:
+        """Generate AI insight for a market, serialized as JSON bytes for the canister."""
+        # Serialize the shared insight directly; no defensive copy is needed for bytes
+        insight = await self._get_insight(
+            market_id, market_title, market_description, current_price, research_depth
+        )
+        return _to_json_bytes(insight)
+    
+    async def _get_insight(
+        self, 
+        market_id: str, 
+        market_title: str, 
+        market_description: str,
+        current_price: Optional[float],
+        research_depth: str
+    ) -> Dict[str, Any]:
+        """Return the cached or coalesced insight dict, which is shared and must not be mutated."""
+        key = (market_id, research_depth, round(current_price, 2) if current_price is not None else None)
+        # Futures belong to the loop that created them, so coalesce per loop
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, key)
+        
+        while True:
+            cached = self._insight_cache.get(key)
+            if cached is not None:
+                created_at, insight = cached
+                if time.monotonic() - created_at <= INSIGHT_CACHE_TTL_SECONDS:
+                    self._insight_cache.move_to_end(key)
+                    return insight
+                del self._insight_cache[key]
+            
+            # Coalesce concurrent requests for the same market onto a single pipeline run
+            inflight = self._insight_inflight.get(inflight_key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Task.cancelling() only exists on Python 3.11+
+                cancelling = getattr(asyncio.current_task(), "cancelling", None)
+                if not inflight.cancelled() or (cancelling is not None and cancelling()):
+                    raise
+                # The owning caller was cancelled, not us; retry and run the pipeline ourselves
+        
+        future = loop.create_future()
+        self._insight_inflight[inflight_key] = future
         try:
-            logger.info(f"Generating AI insight for market {market_id}: {market_title}")
+            insight = await self._generate_insight_uncached(
+                market_id, market_title, market_description, current_price, research_depth
+            )
+            future.set_result(insight)
+        except BaseException:
+            # Only cancellation escapes the pipeline wrapper; propagate it to waiters
+            future.cancel()
+            raise
+        finally:
+            del self._insight_inflight[inflight_key]
+        
+        if insight.get("metadata", {}).get("success"):
+            self._insight_cache[key] = (time.monotonic(), insight)
+            if len(self._insight_cache) > INSIGHT_CACHE_MAX_ENTRIES:
+                self._insight_cache.popitem(last=False)
+        return insight
+    
+    async def _generate_insight_uncached(
+        self, 
+        market_id: str, 
+        market_title: str, 
+        market_description: str,
+        current_price: Optional[float],
+        research_depth: str
+    ) -> Dict[str, Any]:
+        """Run the full agent pipeline and convert the result to the canister format."""
+        try:
+            logger.info("Generating AI insight for market %s: %s", market_id, market_title)
             
             # Configure pipeline
             config = PipelineConfig(
@@ -73,54 +239,23 @@ class ICPAgentCanister:
             
             # Run full agent pipeline
             result = await self.orchestrator.analyze_market(
-                question=market_title,
-                market_context=market_description,
-                market_price=current_price,
-                config=config
+                market_question=market_title,
+                config=config,
+                market_price=current_price
             )
             
-            # Convert to ICP canister format
-            insight_data = {
-                "market_id": market_id,
-                "generated_at": datetime.now().isoformat(),
-                "ai_prediction": {
-                    "probability": result.probability,
-                    "confidence": result.confidence.upper(),
-                    "recommendation": result.recommendation,
-                    "reasoning": result.reasoning[:500],  # Truncate for canister storage
-                },
-                "risk_assessment": {
-                    "risk_level": result.risk_level,
-                    "risk_factors": result.errors if result.errors else ["Standard market risks"]
-                },
-                "market_analysis": {
-                    "kelly_fraction": getattr(result, 'kelly_fraction', 0.0),
-                    "expected_value": getattr(result, 'expected_value', 0.0),
-                    "market_price": current_price
-                },
-                "metadata": {
-                    "research_depth": research_depth,
-                    "processing_time": result.duration_seconds,
-                    "agent_version": "1.0.0",
-                    "success": result.success
-                }
-            }
+            insight_data = _build_insight_payload(result, market_id, current_price, research_depth)
             
-            logger.info(f"AI insight generated successfully for market {market_id}")
+            logger.info("AI insight generated successfully for market %s", market_id)
             return insight_data
             
         except Exception as e:
-            logger.error(f"Failed to generate insight for market {market_id}: {e}")
+            logger.error("Failed to generate insight for market %s: %s", market_id, e)
             return {
                 "market_id": market_id,
-                "generated_at": datetime.now().isoformat(),
+                "generated_at": _iso_now(),
                 "error": str(e),
-                "ai_prediction": {
-                    "probability": 0.5,
-                    "confidence": "LOW",
-                    "recommendation": "INSUFFICIENT_DATA",
-                    "reasoning": f"AI analysis failed: {str(e)}"
-                },
+                "ai_prediction": {**_ERROR_PREDICTION, "reasoning": f"AI analysis failed: {e}"},
                 "metadata": {
                     "success": False,
                     "error_type": type(e).__name__
@@ -131,7 +266,8 @@ class ICPAgentCanister:
         self, 
         market_title: str, 
         market_description: str,
-        resolution_criteria: Optional[str] = None
+        resolution_criteria: Optional[str] = None,
+        force_research: bool = False
     ) -> Dict[str, Any]:
         """
         Validate market quality and provide recommendations for improvement.
@@ -140,111 +276,170 @@ class ICPAgentCanister:
             market_title: Proposed market title
             market_description: Market description
             resolution_criteria: How the market will be resolved
+            force_research: Run research even when structural checks already fail
             
         Returns:
             Dict with validation result and suggestions
         """
         try:
-            # Use search agent for quick validation research
-            if not self.search_agent:
-                self.search_agent = SearchAgent(market_title)
+            # Cheap structural checks first
+            is_valid = len(market_title) > 10 and len(market_description) > 50
+            suggestions = []
+            
+            if len(market_title) <= 10:
+                suggestions.append("Market title should be more descriptive")
+            
+            if len(market_description) <= 50:
+                suggestions.append("Market description needs more detail")
+            
+            if not resolution_criteria:
+                suggestions.append("Consider adding clear resolution criteria")
+            
+            # Research can't rescue a structurally invalid market, so skip the round trip
+            if not is_valid and not force_research:
+                return {
+                    **_VALIDATION_ERROR,
+                    "suggestions": suggestions,
+                    "research_summary": "skipped",
+                    "validated_at": _iso_now()
+                }
+            
+            # Use a search agent built for this market's question (cheap: the Tavily client is shared)
+            search_agent = SearchAgent(market_title)
+            self.search_agent = search_agent
             
             # Quick research on the market topic
-            research_result = await self.search_agent.research(
+            research_result = await search_agent.research(
                 f"Market validation: {market_title}"
             )
             
             # Basic validation logic
             validation_score = 0.8  # Would be calculated based on research
-            is_valid = len(market_title) > 10 and len(market_description) > 50
             
-            validation_result = {
+            return {
                 "is_valid": is_valid,
                 "validation_score": validation_score,
-                "suggestions": [],
+                "suggestions": suggestions,
                 "research_summary": research_result[:200] if research_result else "No research available",
-                "validated_at": datetime.now().isoformat()
+                "validated_at": _iso_now()
             }
             
-            # Add suggestions based on validation
-            if len(market_title) <= 10:
-                validation_result["suggestions"].append("Market title should be more descriptive")
-            
-            if len(market_description) <= 50:
-                validation_result["suggestions"].append("Market description needs more detail")
-            
-            if not resolution_criteria:
-                validation_result["suggestions"].append("Consider adding clear resolution criteria")
-            
-            return validation_result
-            
         except Exception as e:
-            logger.error(f"Market validation failed: {e}")
+            logger.error("Market validation failed: %s", e)
             return {
-                "is_valid": False,
-                "validation_score": 0.0,
+                **_VALIDATION_ERROR,
                 "error": str(e),
-                "validated_at": datetime.now().isoformat()
+                "validated_at": _iso_now()
             }
     
+    async def _analyze_market_tagged(
+        self,
+        index: int,
+        market_data: Dict[str, Any],
+        research_depth: str,
+        as_bytes: bool = False
+    ) -> Tuple[str, Union[Dict[str, Any], bytes]]:
+        """Analyze one batch market, returning (market_id, insight or error dict)."""
+        market_id = market_data.get("id", f"market_{index}")
+        generate = self.generate_insight_bytes if as_bytes else self.generate_insight
+        try:
+            insight = await generate(
+                market_id=market_data["id"],
+                market_title=market_data["title"],
+                market_description=market_data.get("description", ""),
+                current_price=market_data.get("price"),
+                research_depth=research_depth
+            )
+            return market_id, insight
+        except Exception as e:
+            logger.error("Batch analysis failed for market %s: %s", market_id, e)
+            error = {
+                "market_id": market_id,
+                "error": str(e),
+                "success": False
+            }
+            return market_id, _to_json_bytes(error) if as_bytes else error
+    
     async def batch_analyze_markets(
         self, 
-        markets: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        markets: List[Dict[str, Any]],
+        max_concurrency: int = 10,
+        research_depth: str = "quick",
+        as_bytes: bool = False
+    ) -> List[Union[Dict[str, Any], bytes]]:
         """
         Analyze multiple markets in batch for efficiency.
         
         Args:
             markets: List of market dicts with id, title, description
+            max_concurrency: Max concurrent analyses (match backend API limits)
+            research_depth: Research depth for every market (quick by default)
+            as_bytes: Return each insight as JSON bytes ready for the canister
             
         Returns:
-            List of insights for each market
+            List of insights for each market, in input order
         """
-        insights = []
+        # Fixed worker pool: at most max_concurrency analyses are allocated at once
+        queue: "asyncio.Queue[Tuple[int, Dict[str, Any]]]" = asyncio.Queue()
+        for item in enumerate(markets):
+            queue.put_nowait(item)
         
-        # Process markets with some concurrency but not too much to avoid API limits
-        semaphore = asyncio.Semaphore(3)  # Max 3 concurrent analyses
+        results: List[Union[Dict[str, Any], bytes, None]] = [None] * len(markets)
         
-        async def analyze_single_market(market_data):
-            async with semaphore:
-                return await self.generate_insight(
-                    market_id=market_data["id"],
-                    market_title=market_data["title"],
-                    market_description=market_data.get("description", ""),
-                    current_price=market_data.get("price"),
-                    research_depth="quick"  # Use quick analysis for batch processing
-                )
+        async def worker():
+            while True:
+                i, market = await queue.get()
+                try:
+                    _, results[i] = await self._analyze_market_tagged(i, market, research_depth, as_bytes)
+                finally:
+                    queue.task_done()
         
-        tasks = [analyze_single_market(market) for market in markets]
-        insights = await asyncio.gather(*tasks, return_exceptions=True)
+        workers = [asyncio.create_task(worker()) for _ in range(min(max(1, max_concurrency), len(markets)))]
+        try:
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+        return results
+    
+    async def stream_analyze_markets(
+        self,
+        markets: List[Dict[str, Any]],
+        max_concurrency: int = 10,
+        research_depth: str = "quick",
+        as_bytes: bool = False
+    ) -> AsyncIterator[Tuple[str, Union[Dict[str, Any], bytes]]]:
+        """
+        Analyze multiple markets, yielding (market_id, insight) as each one finishes.
         
-        # Handle any exceptions
-        processed_insights = []
-        for i, insight in enumerate(insights):
-            if isinstance(insight, Exception):
-                logger.error(f"Batch analysis failed for market {markets[i].get('id', i)}: {insight}")
-                processed_insights.append({
-                    "market_id": markets[i].get("id", f"market_{i}"),
-                    "error": str(insight),
-                    "success": False
-                })
-            else:
-                processed_insights.append(insight)
+        Same arguments as batch_analyze_markets. Remaining analyses are cancelled
+        if the consumer stops iterating early.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded(i, market):
+            async with semaphore:
+                return await self._analyze_market_tagged(i, market, research_depth, as_bytes)
         
-        return processed_insights
+        tasks = [asyncio.create_task(bounded(i, market)) for i, market in enumerate(markets)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
     
     def get_agent_status(self) -> Dict[str, Any]:
         """Get current status of all agents."""
         return {
-            "canister_status": "active",
+            **_STATUS_TEMPLATE,
             "agents_initialized": {
                 "search_agent": self.search_agent is not None,
                 "analysis_agent": self.analysis_agent is not None,
                 "prediction_agent": self.prediction_agent is not None,
                 "advice_agent": self.advice_agent is not None
             },
-            "last_updated": datetime.now().isoformat(),
-            "version": "1.0.0"
+            "last_updated": _iso_now()
         }
 
 
@@ -254,6 +449,33 @@ def create_icp_agent_canister() -> ICPAgentCanister:
     return ICPAgentCanister()
 
 
+# Shared canister for the entry points below (created and initialized once per process)
+_canister: Optional[ICPAgentCanister] = None
+# Creation locks, made lazily per event loop since an asyncio.Lock binds to the loop that uses it
+_canister_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def _get_canister_lock() -> asyncio.Lock:
+    """Return the canister creation lock for the running event loop."""
+    loop = asyncio.get_running_loop()
+    lock = _canister_locks.get(loop)
+    if lock is None:
+        lock = _canister_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def _get_canister() -> ICPAgentCanister:
+    """Return the shared canister, creating and initializing it on first use."""
+    global _canister
+    if _canister is None:
+        async with _get_canister_lock():
+            if _canister is None:
+                canister = create_icp_agent_canister()
+                await canister.initialize_agents()
+                _canister = canister
+    return _canister
+
+
 # Main functions that can be called from ICP_hack's insight canister
 async def icp_generate_insight(
     market_id: str,
@@ -266,8 +488,7 @@ async def icp_generate_insight(
     
     This replaces the mock implementation in the insight.mo canister.
     """
-    canister = create_icp_agent_canister()
-    await canister.initialize_agents()
+    canister = await _get_canister()
     
     return await canister.generate_insight(
         market_id=market_id,
@@ -285,8 +506,7 @@ async def icp_validate_market(
     """
     Market validation function for ICP_hack integration.
     """
-    canister = create_icp_agent_canister()
-    await canister.initialize_agents()
+    canister = await _get_canister()
     
     return await canister.validate_market(
         market_title=market_title,
@@ -310,7 +530,7 @@ if __name__ == "__main__":
         )
         
         print("Test Insight Generated:")
-        print(json.dumps(test_insight, indent=2))
+        print(_to_json_bytes(test_insight, indent=True).decode())
         
         # Test market validation
         validation = await canister.validate_market(
@@ -319,6 +539,6 @@ if __name__ == "__main__":
         )
         
         print("\nMarket Validation:")
-        print(json.dumps(validation, indent=2))
+        print(_to_json_bytes(validation, indent=True).decode())
     
     asyncio.run(test_integration())
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Numeric core of the Kelly optimizer, JIT-compiled with Numba when available.
+
+Set KELLY_JIT=0 to skip Numba entirely (no import, no compile or cache-load
+warmup); short-lived processes then use the optimizer's NumPy/pure-Python paths.
+"""
+
+import os
+
+import numpy as np
+
+if os.getenv('KELLY_JIT', '1') != '0':
+    try:
+        import numba
+    except ImportError:  # Optional JIT compilation of the Kelly core
+        numba = None
+else:
+    numba = None
+
+
+def _kelly_from_pp(p, price):
+    """Base Kelly fraction for probability estimate p at the given market price."""
+    if price <= 0 or price >= 1:
+        return 0.0
+    odds = (1 / price) - 1
+    if odds <= 0:
+        return 0.0
+    return max((p * odds - (1 - p)) / odds, 0.0)
+
+
+def _compute_position_py(
+    p, price, conf, liq, spread, tth,
+    conf_x, conf_y, min_conf, liquidity_penalty, time_decay_factor,
+    mode_scale, max_position_size, exposure_multiplier, stress_errors, stress_test
+):
+    """
+    Size one validated opportunity (same math as AdvancedKellyOptimizer's scalar path).
+
+    mode_scale < 0 selects ADAPTIVE scaling. exposure_multiplier is the portfolio
+    reduction factor (1.0 when the portfolio is not over-exposed).
+
+    Returns:
+        (base_kelly, final_kelly, expected_value, confidence_penalty, risk_penalty)
+    """
+    base_kelly = _kelly_from_pp(p, price)
+    expected_value = p / price - 1 if 0 < price < 1 else 0.0
+
+    # Confidence adjustment (interpolation on the sorted curve, clamped at both ends)
+    if conf < min_conf:
+        kelly = 0.0
+        confidence_penalty = 1.0
+    else:
+        i = np.searchsorted(conf_x, conf, side='right')
+        if i == 0:
+            multiplier = conf_y[0]
+        elif i == len(conf_x):
+            multiplier = conf_y[-1]
+        else:
+            x1, x2 = conf_x[i - 1], conf_x[i]
+            y1, y2 = conf_y[i - 1], conf_y[i]
+            multiplier = y1 + (y2 - y1) * (conf - x1) / (x2 - x1)
+        kelly = base_kelly * multiplier
+        confidence_penalty = 1 - multiplier
+
+    # Risk adjustments
+    risk_penalty = 0.0
+    if liq < 1000:
+        kelly *= liquidity_penalty
+        risk_penalty += 1 - liquidity_penalty
+    if spread > 0.05:
+        spread_mult = max(1 - (spread * 2), 0.5)
+        kelly *= spread_mult
+        risk_penalty += 1 - spread_mult
+    if tth > 2160:
+        time_mult = time_decay_factor ** ((tth - 2160) / 168)
+        kelly *= time_mult
+        risk_penalty += 1 - time_mult
+
+    # Kelly mode scaling
+    if mode_scale >= 0:
+        kelly *= mode_scale
+    elif kelly > 0.2:
+        kelly *= 0.25
+    elif kelly > 0.1:
+        kelly *= 0.5
+    else:
+        kelly *= 0.75
+
+    # Portfolio constraints
+    kelly = min(kelly, max_position_size) * exposure_multiplier
+
+    # Stress test
+    if stress_test:
+        worst_case_kelly = kelly
+        for prob_error in stress_errors:
+            stressed_kelly = _kelly_from_pp(max(0.01, p + prob_error), price) * 0.5
+            worst_case_kelly = min(worst_case_kelly, stressed_kelly)
+        kelly = worst_case_kelly * 0.8
+
+    return base_kelly, kelly, expected_value, confidence_penalty, risk_penalty
+
+
+if numba is not None:
+    _kelly_from_pp = numba.njit(cache=True)(_kelly_from_pp)
+    compute_position = numba.njit(cache=True)(_compute_position_py)
+
+    @numba.njit(parallel=True, cache=True)
+    def compute_positions(
+        p, price, conf, liq, spread, tth,
+        conf_x, conf_y, min_conf, liquidity_penalty, time_decay_factor,
+        mode_scale, max_position_size, exposure_multiplier, stress_errors, stress_test
+    ):
+        """
+        compute_position over arrays of opportunities, one market per parallel iteration.
+
+        Returns an (n, 5) array with the same column order as compute_position.
+        """
+        n = len(p)
+        out = np.empty((n, 5))
+        for i in numba.prange(n):
+            out[i] = compute_position(
+                p[i], price[i], conf[i], liq[i], spread[i], tth[i],
+                conf_x, conf_y, min_conf, liquidity_penalty, time_decay_factor,
+                mode_scale, max_position_size, exposure_multiplier, stress_errors, stress_test
+            )
+        return out
+else:
+    compute_position = None
+    compute_positions = None
@@ -2,11 +2,17 @@
 Advanced Kelly Criterion implementation for prediction markets with safety features.
 """
 
+import bisect
+import functools
+
 import numpy as np
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 import math
+import sys
+
+from agent_pipeline.utils._kelly_core import compute_position, compute_positions
 
 
 class KellyMode(Enum):
@@ -16,7 +22,28 @@ class KellyMode(Enum):
     ADAPTIVE = "adaptive"   # Adaptive based on confidence
 
 
-@dataclass
+# Fixed multipliers per Kelly mode (ADAPTIVE depends on the Kelly magnitude)
+KELLY_MODE_SCALES = {
+    KellyMode.FULL: 1.0,
+    KellyMode.FRACTIONAL_50: 0.5,
+    KellyMode.FRACTIONAL_25: 0.25,
+}
+
+
+# Recommendation values, interned so results share one object per value
+HOLD = sys.intern("HOLD")
+BUY_YES = sys.intern("BUY_YES")
+BUY_NO = sys.intern("BUY_NO")
+SMALL_BUY = sys.intern("SMALL_BUY")
+
+INVALID_OPPORTUNITY_REASONING = "Invalid opportunity parameters"
+
+# Stress scenarios: probability overestimates (large, moderate, small)
+STRESS_PROB_ERRORS = (-0.2, -0.15, -0.1)
+_STRESS_PROB_ERRORS_ARRAY = np.array(STRESS_PROB_ERRORS, dtype=np.float64)
+
+
+@dataclass(slots=True, frozen=True)
 class MarketOpportunity:
     """Represents a betting opportunity in a prediction market."""
     probability_estimate: float  # Our estimated probability
@@ -28,7 +55,7 @@ class MarketOpportunity:
     market_id: str            # Market identifier
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class KellyResult:
     """Result of Kelly Criterion calculation."""
     kelly_fraction: float      # Raw Kelly fraction
@@ -41,6 +68,41 @@ class KellyResult:
     reasoning: str            # Explanation of calculation
 
 
+@dataclass(slots=True)
+class KellyResultBatch:
+    """Kelly results for many markets as Structure-of-Arrays (row i is market_ids[i])."""
+    market_ids: List[str]
+    kelly_fractions: np.ndarray
+    adjusted_fractions: np.ndarray
+    expected_values: np.ndarray
+    confidence_adjustments: np.ndarray
+    risk_adjustments: np.ndarray
+    final_position_sizes: np.ndarray
+    recommendations: np.ndarray  # object dtype, one str per market
+    reasonings: List[str]
+    
+    def __len__(self) -> int:
+        return len(self.market_ids)
+    
+    def to_list(self) -> List[KellyResult]:
+        """Materialize one KellyResult per market, in row order."""
+        return list(map(
+            KellyResult,
+            self.kelly_fractions.tolist(),
+            self.adjusted_fractions.tolist(),
+            self.expected_values.tolist(),
+            self.confidence_adjustments.tolist(),
+            self.risk_adjustments.tolist(),
+            self.final_position_sizes.tolist(),
+            self.recommendations.tolist(),
+            self.reasonings
+        ))
+    
+    def to_dict(self) -> Dict[str, KellyResult]:
+        """Materialize results keyed by market id."""
+        return dict(zip(self.market_ids, self.to_list()))
+
+
 class AdvancedKellyOptimizer:
     """
     Advanced Kelly Criterion optimizer with safety features for prediction markets.
@@ -53,7 +115,8 @@ class AdvancedKellyOptimizer:
         min_confidence_threshold: float = 0.6,  # Min confidence to bet
         max_correlation_exposure: float = 0.3,  # Max 30% in correlated bets
         drawdown_protection: bool = True,
-        stress_test: bool = True
+        stress_test: bool = True,
+        enable_reasoning: bool = True  # Build KellyResult.reasoning strings
     ):
         self.kelly_mode = kelly_mode
         self.max_position_size = max_position_size
@@ -61,14 +124,25 @@ class AdvancedKellyOptimizer:
         self.max_correlation_exposure = max_correlation_exposure
         self.drawdown_protection = drawdown_protection
         self.stress_test = stress_test
+        self.enable_reasoning = enable_reasoning
+        
+        # Mode multiplier and label resolved once; a None multiplier means ADAPTIVE
+        self._mode_scale = KELLY_MODE_SCALES.get(kelly_mode)
+        self._mode_reasoning = f"Kelly mode: {kelly_mode.value}"
         
         # Risk adjustment parameters
         self.volatility_penalty = 0.8    # Reduce Kelly in volatile markets
         self.liquidity_penalty = 0.9     # Reduce Kelly in illiquid markets
         self.time_decay_factor = 0.95    # Reduce Kelly for long-term bets
+        self._log_time_decay_per_hour = math.log(self.time_decay_factor) / 168
         
         # Confidence calibration
         self.confidence_curve = self._build_confidence_curve()
+        # Sorted curve points, cached once (tuples for scalar lookups, arrays for np.interp)
+        self._conf_points = tuple(sorted(self.confidence_curve.items()))
+        self._conf_levels = tuple(x for x, _ in self._conf_points)
+        self._conf_x = np.array(self._conf_levels, dtype=np.float64)
+        self._conf_y = np.array([y for _, y in self._conf_points], dtype=np.float64)
     
     def calculate_optimal_position(
         self,
@@ -90,52 +164,46 @@ class AdvancedKellyOptimizer:
         
         # Validate inputs
         if not self._validate_opportunity(opportunity):
-            return KellyResult(
-                kelly_fraction=0.0,
-                adjusted_fraction=0.0,
-                expected_value=0.0,
-                confidence_adjustment=0.0,
-                risk_adjustment=0.0,
-                final_position_size=0.0,
-                recommendation="HOLD",
-                reasoning="Invalid opportunity parameters"
+            return self._invalid_result()
+        
+        # Existing exposure is summed once per call, not per adjustment step
+        total_exposure = self._total_exposure(existing_positions)
+        
+        if compute_position is not None:
+            # Compiled numeric core; only recommendation and reasoning stay in Python
+            base_kelly, final_kelly, expected_value, confidence_penalty, risk_penalty = compute_position(
+                float(opportunity.probability_estimate), float(opportunity.market_price),
+                float(opportunity.confidence_level), float(opportunity.liquidity),
+                float(opportunity.bid_ask_spread), float(opportunity.time_to_resolution),
+                self._conf_x, self._conf_y, self.min_confidence_threshold,
+                self.liquidity_penalty, self.time_decay_factor,
+                -1.0 if self._mode_scale is None else self._mode_scale,
+                self.max_position_size, self._exposure_multiplier(total_exposure),
+                _STRESS_PROB_ERRORS_ARRAY, self.stress_test
             )
-        
-        # Calculate base Kelly fraction
-        base_kelly = self._calculate_base_kelly(opportunity)
-        
-        # Calculate expected value
-        expected_value = self._calculate_expected_value(opportunity)
-        
-        # Apply confidence adjustment
-        confidence_adjusted_kelly, confidence_penalty = self._apply_confidence_adjustment(
-            base_kelly, opportunity.confidence_level
-        )
-        
-        # Apply risk adjustments
-        risk_adjusted_kelly, risk_penalty = self._apply_risk_adjustments(
-            confidence_adjusted_kelly, opportunity
-        )
-        
-        # Apply Kelly mode scaling
-        mode_adjusted_kelly = self._apply_kelly_mode_scaling(risk_adjusted_kelly)
-        
-        # Apply portfolio constraints
-        final_kelly = self._apply_portfolio_constraints(
-            mode_adjusted_kelly, opportunity, existing_positions, bankroll
-        )
-        
-        # Stress test the position
-        if self.stress_test:
-            final_kelly = self._stress_test_position(final_kelly, opportunity)
+        else:
+            base_kelly = self._calculate_base_kelly(opportunity)
+            expected_value = self._calculate_expected_value(opportunity)
+            
+            # Confidence, risk and mode adjustments as one multiplier, then portfolio constraints
+            multiplier, confidence_penalty, risk_penalty = self._combined_multiplier(base_kelly, opportunity)
+            final_kelly = self._apply_portfolio_constraints(
+                base_kelly * multiplier, opportunity, total_exposure, bankroll
+            )
+            
+            # Stress test the position
+            if self.stress_test:
+                final_kelly = self._stress_test_position(final_kelly, opportunity)
         
         # Generate recommendation
         recommendation = self._generate_recommendation(final_kelly, expected_value, opportunity)
         
-        # Generate reasoning
-        reasoning = self._generate_reasoning(
-            base_kelly, confidence_penalty, risk_penalty, final_kelly, opportunity
-        )
+        # Generate reasoning (skipped when callers only consume the numbers)
+        reasoning = ""
+        if self.enable_reasoning:
+            reasoning = self._generate_reasoning(
+                base_kelly, confidence_penalty, risk_penalty, final_kelly, opportunity
+            )
         
         return KellyResult(
             kelly_fraction=base_kelly,
@@ -150,9 +218,12 @@ class AdvancedKellyOptimizer:
     
     def _calculate_base_kelly(self, opportunity: MarketOpportunity) -> float:
         """Calculate base Kelly fraction using standard formula."""
-        
-        p = opportunity.probability_estimate
-        price = opportunity.market_price
+        return self._kelly_from_pp(opportunity.probability_estimate, opportunity.market_price)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _kelly_from_pp(p: float, price: float) -> float:
+        """Base Kelly fraction for probability estimate p at the given market price."""
         
         if price <= 0 or price >= 1:
             return 0.0
@@ -174,9 +245,12 @@ class AdvancedKellyOptimizer:
     
     def _calculate_expected_value(self, opportunity: MarketOpportunity) -> float:
         """Calculate expected value of the bet."""
-        
-        p = opportunity.probability_estimate
-        price = opportunity.market_price
+        return self._ev_from_pp(opportunity.probability_estimate, opportunity.market_price)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _ev_from_pp(p: float, price: float) -> float:
+        """Expected value of a YES bet for probability estimate p at the given market price."""
         
         if price <= 0 or price >= 1:
             return 0.0
@@ -186,75 +260,67 @@ class AdvancedKellyOptimizer:
         
         return p / price - 1
     
-    def _apply_confidence_adjustment(self, kelly: float, confidence: float) -> Tuple[float, float]:
+    def _combined_multiplier(
+        self,
+        base_kelly: float,
+        opportunity: MarketOpportunity
+    ) -> Tuple[float, float, float]:
         """
-        Adjust Kelly fraction based on confidence level.
-        Lower confidence = smaller positions.
+        Confidence, risk and Kelly mode adjustments fused into one multiplier.
+        
+        Returns:
+            (multiplier, confidence_penalty, risk_penalty)
         """
         
+        # Confidence adjustment: lower confidence = smaller positions, no bet below threshold
+        confidence = opportunity.confidence_level
         if confidence < self.min_confidence_threshold:
-            return 0.0, 1.0  # No bet if confidence too low
-        
-        # Use confidence curve for smooth adjustment
-        confidence_multiplier = self._get_confidence_multiplier(confidence)
-        adjusted_kelly = kelly * confidence_multiplier
-        penalty = 1 - confidence_multiplier
-        
-        return adjusted_kelly, penalty
-    
-    def _apply_risk_adjustments(self, kelly: float, opportunity: MarketOpportunity) -> Tuple[float, float]:
-        """Apply various risk adjustments to Kelly fraction."""
+            multiplier, confidence_penalty = 0.0, 1.0
+        else:
+            multiplier = self._get_confidence_multiplier(confidence)
+            confidence_penalty = 1 - multiplier
         
-        total_penalty = 0.0
-        adjusted_kelly = kelly
+        risk_penalty = 0.0
         
         # Liquidity penalty
         if opportunity.liquidity < 1000:  # Low liquidity threshold
-            liquidity_mult = self.liquidity_penalty
-            adjusted_kelly *= liquidity_mult
-            total_penalty += (1 - liquidity_mult)
+            multiplier *= self.liquidity_penalty
+            risk_penalty += (1 - self.liquidity_penalty)
         
         # Spread penalty
         if opportunity.bid_ask_spread > 0.05:  # High spread threshold
             spread_mult = 1 - (opportunity.bid_ask_spread * 2)  # Penalty increases with spread
             spread_mult = max(spread_mult, 0.5)  # Minimum 50% reduction
-            adjusted_kelly *= spread_mult
-            total_penalty += (1 - spread_mult)
+            multiplier *= spread_mult
+            risk_penalty += (1 - spread_mult)
         
         # Time decay penalty for very long-term bets
         if opportunity.time_to_resolution > 2160:  # > 3 months
             weeks_excess = (opportunity.time_to_resolution - 2160) / 168  # Weeks beyond 3 months
             time_mult = self.time_decay_factor ** weeks_excess
-            adjusted_kelly *= time_mult
-            total_penalty += (1 - time_mult)
-        
-        return adjusted_kelly, total_penalty
-    
-    def _apply_kelly_mode_scaling(self, kelly: float) -> float:
-        """Apply Kelly mode scaling (full, fractional, etc.)."""
-        
-        if self.kelly_mode == KellyMode.FULL:
-            return kelly
-        elif self.kelly_mode == KellyMode.FRACTIONAL_50:
-            return kelly * 0.5
-        elif self.kelly_mode == KellyMode.FRACTIONAL_25:
-            return kelly * 0.25
-        elif self.kelly_mode == KellyMode.ADAPTIVE:
-            # Adaptive scaling based on Kelly magnitude
-            if kelly > 0.2:
-                return kelly * 0.25  # Very conservative for large Kelly
-            elif kelly > 0.1:
-                return kelly * 0.5   # Moderate for medium Kelly
+            multiplier *= time_mult
+            risk_penalty += (1 - time_mult)
+        
+        # Kelly mode scaling
+        if self._mode_scale is not None:
+            multiplier *= self._mode_scale
+        else:
+            # Adaptive scaling based on the risk-adjusted Kelly magnitude
+            adjusted_kelly = base_kelly * multiplier
+            if adjusted_kelly > 0.2:
+                multiplier *= 0.25  # Very conservative for large Kelly
+            elif adjusted_kelly > 0.1:
+                multiplier *= 0.5   # Moderate for medium Kelly
             else:
-                return kelly * 0.75  # Less conservative for small Kelly
+                multiplier *= 0.75  # Less conservative for small Kelly
         
-        return kelly
+        return multiplier, confidence_penalty, risk_penalty
     
     def _apply_portfolio_constraints(
         self,
         kelly: float,
         opportunity: MarketOpportunity,
-        existing_positions: Optional[List[Dict]],
+        total_exposure: float,
         bankroll: float
     ) -> float:
         """Apply portfolio-level constraints."""
@@ -263,44 +329,34 @@ class AdvancedKellyOptimizer:
         kelly = min(kelly, self.max_position_size)
         
         # Portfolio correlation constraint (simplified)
-        if existing_positions:
-            total_exposure = sum(pos.get('position_size', 0) for pos in existing_positions)
-            if total_exposure > self.max_correlation_exposure:
-                # Reduce new position if portfolio already highly exposed
-                reduction_factor = max(0.5, 1 - (total_exposure - self.max_correlation_exposure))
-                kelly *= reduction_factor
+        return kelly * self._exposure_multiplier(total_exposure)
+    
+    @staticmethod
+    def _total_exposure(existing_positions: Optional[List[Dict]]) -> float:
+        """Total position size already held across existing positions."""
+        if not existing_positions:
+            return 0.0
+        return sum(pos.get('position_size', 0) for pos in existing_positions)
+    
+    def _exposure_multiplier(self, total_exposure: float) -> float:
+        """Reduction factor for new positions when the portfolio is already highly exposed."""
+        
+        if total_exposure > self.max_correlation_exposure:
+            return max(0.5, 1 - (total_exposure - self.max_correlation_exposure))
         
-        return kelly
+        return 1.0
     
     def _stress_test_position(self, kelly: float, opportunity: MarketOpportunity) -> float:
         """Stress test the position under adverse scenarios."""
         
-        # Monte Carlo stress test
-        stress_scenarios = [
-            {"prob_error": -0.2, "spread_increase": 2.0},  # Overestimated probability
-            {"prob_error": -0.15, "spread_increase": 1.5}, # Moderate overestimate
-            {"prob_error": -0.1, "spread_increase": 1.2},  # Small overestimate
-        ]
-        
         worst_case_kelly = kelly
         
-        for scenario in stress_scenarios:
+        for prob_error in STRESS_PROB_ERRORS:
             # Adjust probability estimate
-            stressed_prob = max(0.01, opportunity.probability_estimate + scenario["prob_error"])
+            stressed_prob = max(0.01, opportunity.probability_estimate + prob_error)
             
-            # Create stressed opportunity
-            stressed_opp = MarketOpportunity(
-                probability_estimate=stressed_prob,
-                market_price=opportunity.market_price,
-                confidence_level=opportunity.confidence_level * 0.8,  # Reduce confidence
-                liquidity=opportunity.liquidity * 0.7,  # Reduce liquidity
-                bid_ask_spread=opportunity.bid_ask_spread * scenario["spread_increase"],
-                time_to_resolution=opportunity.time_to_resolution,
-                market_id=opportunity.market_id
-            )
-            
-            # Calculate Kelly under stress
-            stressed_kelly = self._calculate_base_kelly(stressed_opp)
+            # Calculate Kelly under stress (base Kelly only depends on probability and price)
+            stressed_kelly = self._kelly_from_pp(stressed_prob, opportunity.market_price)
             stressed_kelly *= 0.5  # Conservative scaling under stress
             
             # Use minimum of all scenarios
@@ -313,11 +369,11 @@ class AdvancedKellyOptimizer:
         """Generate trading recommendation."""
         
         if kelly < 0.01 or expected_value <= 0:
-            return "HOLD"
+            return HOLD
         elif kelly >= 0.05:  # 5%+ position
-            return "BUY_YES" if opportunity.probability_estimate > opportunity.market_price else "BUY_NO"
+            return BUY_YES if opportunity.probability_estimate > opportunity.market_price else BUY_NO
         else:
-            return "SMALL_BUY"  # Small position
+            return SMALL_BUY  # Small position
     
     def _generate_reasoning(
         self,
@@ -339,7 +395,7 @@ class AdvancedKellyOptimizer:
         if risk_penalty > 0:
             reasoning_parts.append(f"Risk adjustments: -{risk_penalty:.1%}")
         
-        reasoning_parts.append(f"Kelly mode: {self.kelly_mode.value}")
+        reasoning_parts.append(self._mode_reasoning)
         reasoning_parts.append(f"Final position: {final_kelly:.1%}")
         
         if final_kelly < 0.01:
@@ -361,6 +417,20 @@ class AdvancedKellyOptimizer:
         
         return True
     
+    @staticmethod
+    def _invalid_result() -> KellyResult:
+        """Result returned for opportunities that fail validation."""
+        return KellyResult(
+            kelly_fraction=0.0,
+            adjusted_fraction=0.0,
+            expected_value=0.0,
+            confidence_adjustment=0.0,
+            risk_adjustment=0.0,
+            final_position_size=0.0,
+            recommendation=HOLD,
+            reasoning=INVALID_OPPORTUNITY_REASONING
+        )
+    
     def _build_confidence_curve(self) -> Dict[float, float]:
         """Build confidence adjustment curve."""
         
@@ -377,27 +447,220 @@ class AdvancedKellyOptimizer:
     def _get_confidence_multiplier(self, confidence: float) -> float:
         """Get confidence multiplier using interpolation."""
         
-        curve = self.confidence_curve
-        
-        # Find surrounding points
-        confidence_levels = sorted(curve.keys())
+        # Binary search for the bracket; for a single value this beats np.interp's call overhead
+        i = bisect.bisect_right(self._conf_levels, confidence)
         
-        if confidence <= confidence_levels[0]:
-            return curve[confidence_levels[0]]
+        if i == 0:
+            return self._conf_points[0][1]
         
-        if confidence >= confidence_levels[-1]:
-            return curve[confidence_levels[-1]]
+        if i == len(self._conf_points):
+            return self._conf_points[-1][1]
         
         # Linear interpolation
-        for i in range(len(confidence_levels) - 1):
-            if confidence_levels[i] <= confidence <= confidence_levels[i + 1]:
-                x1, x2 = confidence_levels[i], confidence_levels[i + 1]
-                y1, y2 = curve[x1], curve[x2]
-                
-                # Interpolate
-                return y1 + (y2 - y1) * (confidence - x1) / (x2 - x1)
+        x1, y1 = self._conf_points[i - 1]
+        x2, y2 = self._conf_points[i]
+        return y1 + (y2 - y1) * (confidence - x1) / (x2 - x1)
+    
+    def calculate_optimal_position_batch(
+        self,
+        opportunities: List[MarketOpportunity],
+        bankroll: float,
+        existing_positions: Optional[List[Dict]] = None
+    ) -> List[KellyResult]:
+        """
+        Calculate optimal positions for many opportunities in one vectorized pass.
+        
+        Equivalent to calling calculate_optimal_position on each opportunity, but the
+        numeric pipeline runs on NumPy arrays shared across the whole batch.
         
-        return 0.0
+        Args:
+            opportunities: Market opportunities to analyze
+            bankroll: Current bankroll size
+            existing_positions: List of existing positions for correlation analysis
+            
+        Returns:
+            KellyResult per opportunity, in input order
+        """
+        return self._size_batch(opportunities, self._total_exposure(existing_positions)).to_list()
+    
+    def _size_batch(self, opportunities: List[MarketOpportunity], total_exposure: float) -> KellyResultBatch:
+        """Size independent opportunities in one vectorized pass."""
+        soa = self._extract_soa(opportunities)
+        valid, base_kelly, expected_value, confidence_penalty, risk_penalty, final_kelly = (
+            self._calculate_positions_vectorized(*soa, total_exposure)
+        )
+        
+        reasonings = []
+        rows = zip(
+            opportunities, valid.tolist(), base_kelly.tolist(), confidence_penalty.tolist(),
+            risk_penalty.tolist(), final_kelly.tolist()
+        )
+        for opp, is_valid, base, cpen, rpen, final in rows:
+            if not is_valid:
+                reasonings.append(INVALID_OPPORTUNITY_REASONING)
+            elif self.enable_reasoning:
+                reasonings.append(self._generate_reasoning(base, cpen, rpen, final, opp))
+            else:
+                reasonings.append("")
+        
+        return KellyResultBatch(
+            market_ids=[opp.market_id for opp in opportunities],
+            kelly_fractions=base_kelly,
+            adjusted_fractions=final_kelly,
+            expected_values=expected_value,
+            confidence_adjustments=confidence_penalty,
+            risk_adjustments=risk_penalty,
+            final_position_sizes=final_kelly.copy(),
+            recommendations=self._recommendations_vectorized(valid, final_kelly, expected_value, soa[0], soa[1]),
+            reasonings=reasonings
+        )
+    
+    @staticmethod
+    def _extract_soa(opportunities: List[MarketOpportunity]) -> Tuple[np.ndarray, ...]:
+        """Build contiguous arrays (p, price, conf, liq, spread, tth) from opportunities."""
+        rows = np.array(
+            [
+                (
+                    opp.probability_estimate, opp.market_price, opp.confidence_level,
+                    opp.liquidity, opp.bid_ask_spread, opp.time_to_resolution
+                )
+                for opp in opportunities
+            ],
+            dtype=np.float64
+        ).reshape(-1, 6)
+        return tuple(np.ascontiguousarray(rows.T))
+    
+    @staticmethod
+    def _base_kelly_vectorized(p: np.ndarray, price: np.ndarray) -> np.ndarray:
+        """Vectorized _calculate_base_kelly."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            odds = (1 / price) - 1
+            kelly = np.where(
+                (price > 0) & (price < 1) & (odds > 0), (p * odds - (1 - p)) / odds, 0.0
+            )
+        return np.maximum(kelly, 0.0)
+    
+    @staticmethod
+    def _expected_value_vectorized(p: np.ndarray, price: np.ndarray) -> np.ndarray:
+        """Vectorized _calculate_expected_value."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where((price > 0) & (price < 1), p / price - 1, 0.0)
+    
+    def _calculate_positions_vectorized(
+        self,
+        p: np.ndarray,
+        price: np.ndarray,
+        conf: np.ndarray,
+        liq: np.ndarray,
+        spread: np.ndarray,
+        tth: np.ndarray,
+        total_exposure: float = 0.0
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        Vectorized calculate_optimal_position over Structure-of-Arrays inputs.
+        
+        Returns:
+            (valid, base_kelly, expected_value, confidence_penalty, risk_penalty, final_kelly);
+            rows where valid is False are zero
+        """
+        # Branchless validation: one mask over the whole batch
+        valid = (p > 0) & (p < 1) & (price > 0) & (price < 1) & (conf >= 0) & (conf <= 1) & (liq >= 0)
+        
+        if compute_positions is not None:
+            # Compiled core, markets sized in parallel
+            out = compute_positions(
+                p, price, conf, liq, spread, tth,
+                self._conf_x, self._conf_y, self.min_confidence_threshold,
+                self.liquidity_penalty, self.time_decay_factor,
+                -1.0 if self._mode_scale is None else self._mode_scale,
+                self.max_position_size, self._exposure_multiplier(total_exposure),
+                _STRESS_PROB_ERRORS_ARRAY, self.stress_test
+            )
+            columns = (out[:, 0], out[:, 2], out[:, 3], out[:, 4], out[:, 1])
+        else:
+            columns = self._calculate_positions_numpy(p, price, conf, liq, spread, tth, total_exposure)
+        
+        # Invalid rows may hold NaN/inf, so select rather than multiply by the mask
+        return (valid,) + tuple(np.where(valid, column, 0.0) for column in columns)
+    
+    @staticmethod
+    def _recommendations_vectorized(
+        valid: np.ndarray,
+        final_kelly: np.ndarray,
+        expected_value: np.ndarray,
+        p: np.ndarray,
+        price: np.ndarray
+    ) -> np.ndarray:
+        """Vectorized _generate_recommendation (invalid rows HOLD); returns an object array of str."""
+        recommendations = np.full(len(final_kelly), SMALL_BUY, dtype=object)
+        large = final_kelly >= 0.05
+        recommendations[large & (p > price)] = BUY_YES
+        recommendations[large & ~(p > price)] = BUY_NO
+        recommendations[~valid | (final_kelly < 0.01) | (expected_value <= 0)] = HOLD
+        return recommendations
+    
+    def _calculate_positions_numpy(
+        self,
+        p: np.ndarray,
+        price: np.ndarray,
+        conf: np.ndarray,
+        liq: np.ndarray,
+        spread: np.ndarray,
+        tth: np.ndarray,
+        total_exposure: float
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        NumPy implementation of the sizing pipeline, used when numba is unavailable.
+        
+        Returns:
+            (base_kelly, expected_value, confidence_penalty, risk_penalty, final_kelly)
+        """
+        base_kelly = self._base_kelly_vectorized(p, price)
+        expected_value = self._expected_value_vectorized(p, price)
+        
+        # Confidence adjustment
+        confidence_multiplier = np.interp(conf, self._conf_x, self._conf_y)
+        low_confidence = conf < self.min_confidence_threshold
+        kelly = np.where(low_confidence, 0.0, base_kelly * confidence_multiplier)
+        confidence_penalty = np.where(low_confidence, 1.0, 1 - confidence_multiplier)
+        
+        # Risk adjustments
+        risk_penalty = np.zeros_like(kelly)
+        
+        low_liquidity = liq < 1000
+        kelly = np.where(low_liquidity, kelly * self.liquidity_penalty, kelly)
+        risk_penalty = np.where(low_liquidity, risk_penalty + (1 - self.liquidity_penalty), risk_penalty)
+        
+        high_spread = spread > 0.05
+        spread_mult = np.maximum(1 - (spread * 2), 0.5)
+        kelly = np.where(high_spread, kelly * spread_mult, kelly)
+        risk_penalty = np.where(high_spread, risk_penalty + (1 - spread_mult), risk_penalty)
+        
+        long_dated = tth > 2160
+        # decay ** (hours / 168) as one exp over a precomputed log rate (cheaper than np.power)
+        time_mult = np.exp(np.maximum(tth - 2160, 0) * self._log_time_decay_per_hour)
+        kelly = np.where(long_dated, kelly * time_mult, kelly)
+        risk_penalty = np.where(long_dated, risk_penalty + (1 - time_mult), risk_penalty)
+        
+        # Kelly mode scaling
+        if self._mode_scale is not None:
+            kelly = kelly * self._mode_scale
+        else:
+            kelly = kelly * np.select([kelly > 0.2, kelly > 0.1], [0.25, 0.5], 0.75)
+        
+        # Hard cap at max position size
+        kelly = np.minimum(kelly, self.max_position_size)
+        
+        # Portfolio correlation constraint (simplified), shared by every opportunity in the batch
+        kelly = kelly * self._exposure_multiplier(total_exposure)
+        
+        # Stress test: all scenarios as one (N, scenarios) matrix reduced per row
+        if self.stress_test:
+            stressed_prob = np.maximum(0.01, p[:, None] + _STRESS_PROB_ERRORS_ARRAY)
+            stressed_kelly = self._base_kelly_vectorized(stressed_prob, price[:, None]) * 0.5
+            kelly = np.minimum(kelly, stressed_kelly.min(axis=1, initial=np.inf)) * 0.8
+        
+        return base_kelly, expected_value, confidence_penalty, risk_penalty, kelly
     
     def calculate_multi_market_kelly(
         self,
@@ -416,48 +679,51 @@ class AdvancedKellyOptimizer:
         Returns:
             Dictionary of market_id -> KellyResult
         """
+        return self.calculate_multi_market_kelly_batch(opportunities, correlations, bankroll).to_dict()
+    
+    def calculate_multi_market_kelly_batch(
+        self,
+        opportunities: List[MarketOpportunity],
+        correlations: Optional[np.ndarray] = None,
+        bankroll: float = 1000.0
+    ) -> KellyResultBatch:
+        """
+        Same as calculate_multi_market_kelly, returning parallel arrays instead of a dict.
         
-        results = {}
+        Lets portfolio code reduce over a field directly (e.g. final_position_sizes.sum()).
+        """
         
         # If no correlations provided, treat markets as independent
         if correlations is None:
-            for opp in opportunities:
-                results[opp.market_id] = self.calculate_optimal_position(opp, bankroll)
-            return results
+            return self._size_batch(opportunities, 0.0)
         
         # Advanced multi-market Kelly (simplified implementation)
         # In practice, this would use portfolio optimization techniques
         
         total_kelly_budget = self.max_correlation_exposure
         
-        # Calculate individual Kelly fractions
-        individual_kellys = []
-        for opp in opportunities:
-            kelly_result = self.calculate_optimal_position(opp, bankroll)
-            individual_kellys.append(kelly_result.adjusted_fraction)
+        # Individual Kelly fractions (invalid opportunities size to zero)
+        p, price, *rest = self._extract_soa(opportunities)
+        valid, *_, individual_kellys = self._calculate_positions_vectorized(p, price, *rest)
         
         # Scale down if total exceeds budget
-        total_kelly = sum(individual_kellys)
+        total_kelly = individual_kellys.sum()
         if total_kelly > total_kelly_budget:
-            scale_factor = total_kelly_budget / total_kelly
-            individual_kellys = [k * scale_factor for k in individual_kellys]
-        
-        # Create results
-        for i, opp in enumerate(opportunities):
-            adjusted_kelly = individual_kellys[i]
-            
-            results[opp.market_id] = KellyResult(
-                kelly_fraction=adjusted_kelly,
-                adjusted_fraction=adjusted_kelly,
-                expected_value=self._calculate_expected_value(opp),
-                confidence_adjustment=0.0,
-                risk_adjustment=0.0,
-                final_position_size=adjusted_kelly,
-                recommendation=self._generate_recommendation(adjusted_kelly, self._calculate_expected_value(opp), opp),
-                reasoning=f"Multi-market Kelly with correlation adjustment"
-            )
-        
-        return results
+            individual_kellys *= total_kelly_budget / total_kelly
+        
+        expected_value = self._expected_value_vectorized(p, price)
+        
+        return KellyResultBatch(
+            market_ids=[opp.market_id for opp in opportunities],
+            kelly_fractions=individual_kellys,
+            adjusted_fractions=individual_kellys.copy(),
+            expected_values=expected_value,
+            confidence_adjustments=np.zeros_like(individual_kellys),
+            risk_adjustments=np.zeros_like(individual_kellys),
+            final_position_sizes=individual_kellys.copy(),
+            recommendations=self._recommendations_vectorized(valid, individual_kellys, expected_value, p, price),
+            reasonings=["Multi-market Kelly with correlation adjustment"] * len(opportunities)
+        )
 
 
 def demo_kelly_optimizer():
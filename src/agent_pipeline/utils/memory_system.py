@@ -2,16 +2,297 @@
 Memory and Learning System - Store predictions, track performance, and learn from outcomes.
 """
 
+import atexit
 import json
+import queue
+import re
 import sqlite3
+import threading
+import time
+import uuid
+import weakref
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 from dataclasses import dataclass, asdict
-import statistics
 import numpy as np
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # Optional fast JSON codec for metadata columns
+    orjson = None
+
+try:
+    import numba
+except ImportError:  # Optional JIT for the PnL statistics kernel
+    numba = None
+
+# Rows per insert transaction in store_predictions (bounds journal growth on backfills)
+PREDICTION_INSERT_BATCH_SIZE = 5000
+
+# Prepared-statement cache size per connection (statements are cached by exact SQL text)
+SQLITE_CACHED_STATEMENTS = 256
+
+# Shared insert statement; column order matches MemorySystem._prediction_row.
+# An existing prediction_id is updated in place (an upsert rather than INSERT OR REPLACE),
+# so the FTS and rollup triggers see a plain UPDATE and the row keeps its prediction_rowid.
+INSERT_PREDICTION_SQL = """
+    INSERT INTO predictions (
+        prediction_id, market_question, predicted_probability, confidence_level,
+        market_price_at_prediction, position_taken, position_size, expected_value,
+        kelly_fraction, prediction_timestamp, resolution_timestamp, actual_outcome,
+        realized_pnl, prediction_accuracy, calibration_score, market_category,
+        research_depth, scenario_analysis_used, social_sentiment_used, reasoning, metadata,
+        prediction_ts_ns
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(prediction_id) DO UPDATE SET
+        market_question = excluded.market_question,
+        predicted_probability = excluded.predicted_probability,
+        confidence_level = excluded.confidence_level,
+        market_price_at_prediction = excluded.market_price_at_prediction,
+        position_taken = excluded.position_taken,
+        position_size = excluded.position_size,
+        expected_value = excluded.expected_value,
+        kelly_fraction = excluded.kelly_fraction,
+        prediction_timestamp = excluded.prediction_timestamp,
+        resolution_timestamp = excluded.resolution_timestamp,
+        actual_outcome = excluded.actual_outcome,
+        realized_pnl = excluded.realized_pnl,
+        prediction_accuracy = excluded.prediction_accuracy,
+        calibration_score = excluded.calibration_score,
+        market_category = excluded.market_category,
+        research_depth = excluded.research_depth,
+        scenario_analysis_used = excluded.scenario_analysis_used,
+        social_sentiment_used = excluded.social_sentiment_used,
+        reasoning = excluded.reasoning,
+        metadata = excluded.metadata,
+        prediction_ts_ns = excluded.prediction_ts_ns
+"""
+
+# Resolution update; accuracy is the inverted Brier score (higher is better) and
+# calibration is the probability assigned to the realized outcome (simplified)
+UPDATE_OUTCOME_SQL = """
+    UPDATE predictions 
+    SET actual_outcome = ?, realized_pnl = ?, resolution_timestamp = ?,
+        prediction_accuracy = 1.0 - (predicted_probability - ?) * (predicted_probability - ?),
+        calibration_score = CASE WHEN ? THEN predicted_probability ELSE 1.0 - predicted_probability END
+    WHERE prediction_id = ?
+"""
+
+# Background prediction writer: queue bound, max rows per batch, and how long to
+# keep collecting after the first queued row
+WRITE_QUEUE_MAX_SIZE = 10_000
+WRITE_BATCH_MAX_ITEMS = 1000
+WRITE_BATCH_WAIT_SECONDS = 0.05
+# How often an idle writer checks whether its MemorySystem has been garbage collected
+WRITER_IDLE_CHECK_SECONDS = 1.0
+
+# Queued by flush() so the writer commits what it has without waiting out the batch window
+_FLUSH_MARKER = object()
+
+# Prediction count above which _init_database refreshes planner statistics
+ANALYZE_MIN_PREDICTIONS = 1000
+
+# Performance metrics cache: entries also expire since the window end moves with the clock
+METRICS_CACHE_TTL_SECONDS = 60
+METRICS_CACHE_MAX_ENTRIES = 64
+
+# PnL series length above which the fused JIT kernel replaces the NumPy passes
+PNL_STATS_JIT_MIN_SIZE = 10_000
+
+# daily_metrics rollup: one row per (UTC day of prediction_ts_ns, category)
+DAY_NS = 86_400 * 1_000_000_000
+DAILY_METRICS_COLUMNS = (
+    "n", "sum_pos", "n_resolved", "n_accurate", "n_cal", "sum_cal", "n_pnl", "sum_pnl", "wins"
+)
+
+# Applied to every connection; journal_mode=WAL also persists in the database file
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def _dumps_metadata(data: Dict[str, Any]) -> str:
+    """Serialize a metadata dict for a TEXT column, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(data)
+
+
+def _loads_metadata(text: str) -> Dict[str, Any]:
+    """Parse a metadata TEXT column, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _pnl_stats(pnl):
+    """
+    Mean, population std and max drawdown of a PnL series in one pass.
+    
+    Drawdown is measured against the running peak of cumulative PnL (starting
+    from the first value), matching the np.maximum.accumulate formulation.
+    """
+    mean = 0.0
+    m2 = 0.0
+    cumulative = 0.0
+    peak = -np.inf
+    max_drawdown = 0.0
+    for i in range(len(pnl)):
+        x = pnl[i]
+        delta = x - mean
+        mean += delta / (i + 1)
+        m2 += delta * (x - mean)
+        cumulative += x
+        if cumulative > peak:
+            peak = cumulative
+        if peak - cumulative > max_drawdown:
+            max_drawdown = peak - cumulative
+    return mean, np.sqrt(m2 / len(pnl)), max_drawdown
+
+
+_pnl_stats_jit = numba.njit(cache=True)(_pnl_stats) if numba is not None else None
+
+
+def _daily_metrics_terms(ref: str) -> List[str]:
+    """Per-row contributions to DAILY_METRICS_COLUMNS; ref is a row prefix such as 'new.'."""
+    resolved = f"{ref}actual_outcome IS NOT NULL"
+    return [
+        "1",
+        f"{ref}position_size",
+        f"CASE WHEN {resolved} THEN 1 ELSE 0 END",
+        f"CASE WHEN {resolved} AND {ref}prediction_accuracy > 0.5 THEN 1 ELSE 0 END",
+        f"CASE WHEN {resolved} AND {ref}calibration_score IS NOT NULL THEN 1 ELSE 0 END",
+        f"CASE WHEN {resolved} THEN COALESCE({ref}calibration_score, 0.0) ELSE 0.0 END",
+        f"CASE WHEN {resolved} AND {ref}realized_pnl IS NOT NULL THEN 1 ELSE 0 END",
+        f"CASE WHEN {resolved} THEN COALESCE({ref}realized_pnl, 0.0) ELSE 0.0 END",
+        f"CASE WHEN {resolved} AND {ref}realized_pnl > 0 THEN 1 ELSE 0 END",
+    ]
+
+
+def _daily_metrics_upsert(ref: str, sign: str) -> str:
+    """Trigger statement adding (sign '') or removing (sign '-') one row's contributions."""
+    columns = ", ".join(DAILY_METRICS_COLUMNS)
+    values = ", ".join(f"{sign}({term})" for term in _daily_metrics_terms(ref))
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in DAILY_METRICS_COLUMNS)
+    return f"""
+        INSERT INTO daily_metrics (day, category, {columns})
+        VALUES ({ref}prediction_ts_ns / {DAY_NS}, {ref}market_category, {values})
+        ON CONFLICT(day, category) DO UPDATE SET {updates};
+    """
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """
+    Open an autocommit connection with the tuned PRAGMAs applied.
+    
+    Multi-statement writes issue their own BEGIN (e.g. BEGIN IMMEDIATE).
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=SQLITE_CACHED_STATEMENTS)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _insert_prediction_rows(conn: sqlite3.Connection, rows: List[Tuple]):
+    """Insert predictions table rows, one transaction per batch; raises on failure."""
+    cursor = conn.cursor()
+    for start in range(0, len(rows), PREDICTION_INSERT_BATCH_SIZE):
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany(INSERT_PREDICTION_SQL, rows[start:start + PREDICTION_INSERT_BATCH_SIZE])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _prediction_writer(owner_ref: "weakref.ref", write_q: queue.Queue, db_path: str):
+    """
+    Background writer loop: drain queued prediction rows into batched insert transactions.
+    
+    Holds only a weak reference to its MemorySystem, so an instance nobody uses any more
+    can be collected; the thread then exits once the queue is drained.
+    """
+    conn = None
+    while True:
+        try:
+            item = write_q.get(timeout=WRITER_IDLE_CHECK_SECONDS)
+        except queue.Empty:
+            if owner_ref() is None:
+                break
+            continue
+        
+        batch = []
+        markers = 0
+        deadline = time.monotonic() + WRITE_BATCH_WAIT_SECONDS
+        while True:
+            if item is _FLUSH_MARKER:
+                markers += 1
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= WRITE_BATCH_MAX_ITEMS or remaining <= 0:
+                break
+            try:
+                item = write_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+        
+        try:
+            if batch:
+                error = None
+                try:
+                    if conn is None:
+                        conn = _open_connection(db_path)
+                    _insert_prediction_rows(conn, batch)
+                except Exception as e:
+                    error = e
+                owner = owner_ref()
+                if owner is not None:
+                    owner._record_background_write(batch, error)
+                    owner = None
+                elif error is not None:
+                    print(f"Error: Failed to store {len(batch)} queued predictions: {error}")
+        finally:
+            for _ in range(len(batch) + markers):
+                write_q.task_done()
+    
+    if conn is not None:
+        conn.close()
+
+
+# MemorySystems with a background writer; flushed once at interpreter exit (daemon writers
+# would otherwise be killed with rows still queued). Weak, so registration keeps nothing alive.
+_active_memory_systems: "weakref.WeakSet[MemorySystem]" = weakref.WeakSet()
+
+
+def _flush_active_memory_systems():
+    """Commit rows still queued in any live MemorySystem."""
+    for memory in list(_active_memory_systems):
+        memory.flush()
+
+
+atexit.register(_flush_active_memory_systems)
+
+
+def _timestamp_ns(timestamp) -> Optional[int]:
+    """
+    Epoch nanoseconds for an ISO-8601 string or datetime (naive values are local time,
+    matching datetime.now()). Unparseable strings map to None.
+    """
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    return int(timestamp.timestamp()) * 1_000_000_000 + timestamp.microsecond * 1000
+
 
 class PredictionRecord(BaseModel):
     """Record of a prediction made by the system."""
@@ -38,6 +319,43 @@ class PredictionRecord(BaseModel):
     metadata: Dict[str, Any] = {}
 
 
+@dataclass(slots=True, frozen=True)
+class PredictionRow:
+    """
+    Unvalidated predictions table row for internal read paths.
+    
+    Fields follow the table's column order; metadata is left as raw JSON text.
+    Convert to PredictionRecord only at API boundaries.
+    """
+    prediction_id: str
+    market_question: str
+    predicted_probability: float
+    confidence_level: str
+    market_price_at_prediction: float
+    position_taken: str
+    position_size: float
+    expected_value: float
+    kelly_fraction: float
+    prediction_timestamp: str
+    resolution_timestamp: Optional[str]
+    actual_outcome: Optional[int]
+    realized_pnl: Optional[float]
+    prediction_accuracy: Optional[float]
+    calibration_score: Optional[float]
+    market_category: str
+    research_depth: str
+    scenario_analysis_used: int
+    social_sentiment_used: int
+    reasoning: str
+    metadata: str
+
+
+# Explicit projection of the record columns (PredictionRow's positional fields; also
+# PredictionRecord's fields), so reads skip derived columns such as prediction_ts_ns
+PREDICTION_ROW_COLUMNS = ", ".join(PredictionRow.__dataclass_fields__)
+FTS_PREDICTION_ROW_COLUMNS = ", ".join(f"p.{column}" for column in PredictionRow.__dataclass_fields__)
+
+
 class PerformanceMetrics(BaseModel):
     """Performance metrics for the prediction system."""
     total_predictions: int
@@ -85,23 +403,80 @@ class MemorySystem:
     
     def __init__(self, db_path: str = "prediction_memory.db"):
         self.db_path = db_path
+        self._local = threading.local()
         self._init_database()
         
+        # Metrics cache keyed by (days_back, category, write epoch); writes bump the epoch
+        self._metrics_cache: Dict[Tuple, Tuple[float, PerformanceMetrics]] = {}
+        self._write_epoch = 0
+        
+        # Background writer for store_prediction, started on first use
+        self._write_q: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_MAX_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        # (prediction ids, error) per failed background batch, reported by the next flush()
+        self._write_failures: List[Tuple[List[str], str]] = []
+        
         # Learning parameters
         self.min_predictions_for_learning = 10
         self.calibration_bins = 10
         self.pattern_detection_threshold = 3  # Minimum occurrences to identify pattern
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open an autocommit connection to this database with the tuned PRAGMAs applied."""
+        return _open_connection(self.db_path)
+    
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's persistent connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+    
+    def _invalidate_metrics(self):
+        """Drop cached metrics after a write."""
+        self._write_epoch += 1
+        self._metrics_cache.clear()
+    
+    def flush(self) -> bool:
+        """
+        Block until every queued prediction has been written.
+        
+        Returns False, printing the errors, if any background write failed since the
+        last flush. Reads flush first, so they report such failures too.
+        """
+        if self._writer is not None and self._write_q.unfinished_tasks:
+            self._write_q.put(_FLUSH_MARKER)
+            self._write_q.join()
+        
+        if not self._write_failures:
+            return True
+        with self._writer_lock:
+            failures, self._write_failures = self._write_failures, []
+        for prediction_ids, error in failures:
+            shown = ", ".join(prediction_ids[:5]) + (", ..." if len(prediction_ids) > 5 else "")
+            print(f"Error: Failed to store {len(prediction_ids)} queued predictions ({shown}): {error}")
+        return False
+    
+    def close(self):
+        """Flush queued predictions and close the calling thread's connection."""
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
     def _init_database(self):
         """Initialize SQLite database for storing predictions."""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
-        # Create predictions table
-        cursor.execute("""
+        # Create predictions table; prediction_rowid is an explicit rowid alias (stable
+        # across VACUUM, unlike the implicit rowid) that keys the full-text index
+        create_predictions = """
             CREATE TABLE IF NOT EXISTS predictions (
-                prediction_id TEXT PRIMARY KEY,
+                prediction_id TEXT NOT NULL UNIQUE,
                 market_question TEXT NOT NULL,
                 predicted_probability REAL NOT NULL,
                 confidence_level TEXT NOT NULL,
@@ -121,9 +496,41 @@ class MemorySystem:
                 scenario_analysis_used BOOLEAN DEFAULT FALSE,
                 social_sentiment_used BOOLEAN DEFAULT FALSE,
                 reasoning TEXT DEFAULT '',
-                metadata TEXT DEFAULT '{}'
+                metadata TEXT DEFAULT '{}',
+                prediction_ts_ns INTEGER,
+                prediction_rowid INTEGER PRIMARY KEY
             )
-        """)
+        """
+        cursor.execute(create_predictions)
+        
+        # Databases created before prediction_ts_ns existed get the column added
+        cursor.execute("PRAGMA table_info(predictions)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if 'prediction_ts_ns' not in columns:
+            cursor.execute("ALTER TABLE predictions ADD COLUMN prediction_ts_ns INTEGER")
+        
+        # Older tables (prediction_id as TEXT PRIMARY KEY) are rebuilt with prediction_rowid;
+        # copying the implicit rowid keeps an existing full-text index aligned
+        if 'prediction_rowid' not in columns:
+            copied = f"{PREDICTION_ROW_COLUMNS}, prediction_ts_ns"
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                for trigger in (
+                    "predictions_fts_ai", "predictions_fts_ad", "predictions_fts_au",
+                    "daily_metrics_ai", "daily_metrics_ad", "daily_metrics_au_old", "daily_metrics_au_new"
+                ):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                cursor.execute("ALTER TABLE predictions RENAME TO predictions_old")
+                cursor.execute(create_predictions)
+                cursor.execute(f"""
+                    INSERT INTO predictions ({copied}, prediction_rowid)
+                    SELECT {copied}, rowid FROM predictions_old
+                """)
+                cursor.execute("DROP TABLE predictions_old")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
         
         # Create performance metrics table
         cursor.execute("""
@@ -153,59 +560,215 @@ class MemorySystem:
             )
         """)
         
-        conn.commit()
-        conn.close()
+        # Full-text index over market questions (external content, kept in sync by triggers).
+        # An index keyed by the implicit rowid (older databases) is dropped and rebuilt.
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'predictions_fts'")
+        fts_row = cursor.fetchone()
+        fts_current = fts_row is not None and 'prediction_rowid' in fts_row[0]
+        if fts_row is not None and not fts_current:
+            for trigger in ("predictions_fts_ai", "predictions_fts_ad", "predictions_fts_au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute("DROP TABLE predictions_fts")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS predictions_fts
+            USING fts5(market_question, content='predictions', content_rowid='prediction_rowid')
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS predictions_fts_ai AFTER INSERT ON predictions BEGIN
+                INSERT INTO predictions_fts(rowid, market_question)
+                VALUES (new.prediction_rowid, new.market_question);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS predictions_fts_ad AFTER DELETE ON predictions BEGIN
+                INSERT INTO predictions_fts(predictions_fts, rowid, market_question)
+                VALUES ('delete', old.prediction_rowid, old.market_question);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS predictions_fts_au AFTER UPDATE OF market_question ON predictions BEGIN
+                INSERT INTO predictions_fts(predictions_fts, rowid, market_question)
+                VALUES ('delete', old.prediction_rowid, old.market_question);
+                INSERT INTO predictions_fts(rowid, market_question)
+                VALUES (new.prediction_rowid, new.market_question);
+            END
+        """)
+        if not fts_current:
+            cursor.execute("INSERT INTO predictions_fts(predictions_fts) VALUES ('rebuild')")
+        
+        # Indexes for the metrics window, resolved-by-category and recent-insight queries
+        cursor.execute("DROP INDEX IF EXISTS idx_pred_ts_cat")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pred_ts_ns_cat
+            ON predictions(prediction_ts_ns, market_category)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pred_outcome_cat
+            ON predictions(market_category, actual_outcome)
+            WHERE actual_outcome IS NOT NULL
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_insights_ts
+            ON learning_insights(created_timestamp DESC, impact_score DESC)
+        """)
+        
+        # Backfill epoch timestamps for rows written before the column existed
+        cursor.execute("SELECT prediction_id, prediction_timestamp FROM predictions WHERE prediction_ts_ns IS NULL")
+        backfill = [(_timestamp_ns(timestamp), prediction_id) for prediction_id, timestamp in cursor.fetchall()]
+        if backfill:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany("UPDATE predictions SET prediction_ts_ns = ? WHERE prediction_id = ?", backfill)
+            cursor.execute("COMMIT")
+        
+        # Daily rollup of the metric sums, maintained by triggers on predictions
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_metrics'")
+        daily_metrics_exists = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_metrics (
+                day INTEGER NOT NULL,
+                category TEXT,
+                n INTEGER NOT NULL DEFAULT 0,
+                sum_pos REAL NOT NULL DEFAULT 0,
+                n_resolved INTEGER NOT NULL DEFAULT 0,
+                n_accurate INTEGER NOT NULL DEFAULT 0,
+                n_cal INTEGER NOT NULL DEFAULT 0,
+                sum_cal REAL NOT NULL DEFAULT 0,
+                n_pnl INTEGER NOT NULL DEFAULT 0,
+                sum_pnl REAL NOT NULL DEFAULT 0,
+                wins INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, category)
+            )
+        """)
+        for name, event, ref, sign in (
+            ("daily_metrics_ai", "AFTER INSERT", "new.", ""),
+            ("daily_metrics_ad", "AFTER DELETE", "old.", "-"),
+            ("daily_metrics_au_old", "AFTER UPDATE", "old.", "-"),
+            ("daily_metrics_au_new", "AFTER UPDATE", "new.", ""),
+        ):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name} {event} ON predictions
+                WHEN {ref}prediction_ts_ns IS NOT NULL BEGIN
+                    {_daily_metrics_upsert(ref, sign)}
+                END
+            """)
+        if not daily_metrics_exists:
+            sums = ", ".join(f"SUM({term})" for term in _daily_metrics_terms(""))
+            cursor.execute(f"""
+                INSERT INTO daily_metrics (day, category, {", ".join(DAILY_METRICS_COLUMNS)})
+                SELECT prediction_ts_ns / {DAY_NS}, market_category, {sums}
+                FROM predictions
+                WHERE prediction_ts_ns IS NOT NULL
+                GROUP BY 1, 2
+            """)
+        
+        # Refresh planner statistics once the table is large enough for them to matter
+        cursor.execute("SELECT COUNT(*) FROM predictions")
+        if cursor.fetchone()[0] >= ANALYZE_MIN_PREDICTIONS:
+            cursor.execute("PRAGMA analysis_limit=400")
+            cursor.execute("ANALYZE")
     
     def store_prediction(self, prediction: PredictionRecord) -> bool:
-        """Store a new prediction in memory."""
+        """
+        Queue a new prediction for the background writer.
         
+        Returns True once the prediction is queued (False if it can't be converted to a
+        row); it is committed with the next batch. True does not mean it was written:
+        a failed background write makes the next flush() return False and print the
+        error, and reads on this MemorySystem flush pending writes first.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Convert prediction to database format
-            cursor.execute("""
-                INSERT OR REPLACE INTO predictions (
-                    prediction_id, market_question, predicted_probability, confidence_level,
-                    market_price_at_prediction, position_taken, position_size, expected_value,
-                    kelly_fraction, prediction_timestamp, resolution_timestamp, actual_outcome,
-                    realized_pnl, prediction_accuracy, calibration_score, market_category,
-                    research_depth, scenario_analysis_used, social_sentiment_used, reasoning, metadata
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                prediction.prediction_id,
-                prediction.market_question,
-                prediction.predicted_probability,
-                prediction.confidence_level,
-                prediction.market_price_at_prediction,
-                prediction.position_taken,
-                prediction.position_size,
-                prediction.expected_value,
-                prediction.kelly_fraction,
-                prediction.prediction_timestamp,
-                prediction.resolution_timestamp,
-                prediction.actual_outcome,
-                prediction.realized_pnl,
-                prediction.prediction_accuracy,
-                prediction.calibration_score,
-                prediction.market_category,
-                prediction.research_depth,
-                prediction.scenario_analysis_used,
-                prediction.social_sentiment_used,
-                prediction.reasoning,
-                json.dumps(prediction.metadata)
-            ))
+            row = self._prediction_row(prediction)
+        except Exception as e:
+            print(f"Error: Failed to store prediction: {e}")
+            return False
+        self._ensure_writer()
+        self._write_q.put(row)
+        return True
+    
+    def store_predictions(self, predictions: List[PredictionRecord]) -> bool:
+        """Store many predictions synchronously, one transaction per batch of rows."""
+        self.flush()
+        return self._insert_predictions(predictions)
+    
+    def _ensure_writer(self):
+        """Start the background writer thread if it is not running yet."""
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                writer = threading.Thread(
+                    target=_prediction_writer,
+                    args=(weakref.ref(self), self._write_q, self.db_path),
+                    name="memory-writer",
+                    daemon=True
+                )
+                writer.start()
+                self._writer = writer
+                _active_memory_systems.add(self)
+    
+    def _record_background_write(self, rows: List[Tuple], error: Optional[Exception]):
+        """Writer-thread callback after a batch: refresh metrics, keep failures for flush()."""
+        self._invalidate_metrics()
+        if error is None:
+            self._report_stored(rows)
+            return
+        with self._writer_lock:
+            self._write_failures.append(([row[0] for row in rows], str(error)))
+    
+    @staticmethod
+    def _report_stored(rows: List[Tuple]):
+        if len(rows) == 1:
+            print(f"Success: Stored prediction: {rows[0][0]}")
+        else:
+            print(f"Success: Stored {len(rows)} predictions")
+    
+    def _insert_predictions(self, predictions: List[PredictionRecord]) -> bool:
+        """Insert predictions, one transaction per batch of rows."""
+        
+        try:
+            rows = [self._prediction_row(prediction) for prediction in predictions]
             
-            conn.commit()
-            conn.close()
+            try:
+                _insert_prediction_rows(self._conn, rows)
+            finally:
+                # Earlier batches may have committed even if a later one failed
+                self._invalidate_metrics()
             
-            print(f"Success: Stored prediction: {prediction.prediction_id}")
+            self._report_stored(rows)
             return True
             
         except Exception as e:
-            print(f"Error: Failed to store prediction: {e}")
+            print(f"Error: Failed to store predictions: {e}")
             return False
     
+    @staticmethod
+    def _prediction_row(prediction: PredictionRecord) -> Tuple:
+        """Convert a prediction to the predictions table column order."""
+        return (
+            prediction.prediction_id,
+            prediction.market_question,
+            prediction.predicted_probability,
+            prediction.confidence_level,
+            prediction.market_price_at_prediction,
+            prediction.position_taken,
+            prediction.position_size,
+            prediction.expected_value,
+            prediction.kelly_fraction,
+            prediction.prediction_timestamp,
+            prediction.resolution_timestamp,
+            prediction.actual_outcome,
+            prediction.realized_pnl,
+            prediction.prediction_accuracy,
+            prediction.calibration_score,
+            prediction.market_category,
+            prediction.research_depth,
+            prediction.scenario_analysis_used,
+            prediction.social_sentiment_used,
+            prediction.reasoning,
+            _dumps_metadata(prediction.metadata),
+            _timestamp_ns(prediction.prediction_timestamp)
+        )
+    
     def update_prediction_outcome(
         self,
         prediction_id: str,
@@ -216,38 +779,18 @@ class MemorySystem:
         """Update a prediction with its actual outcome."""
         
         try:
+            self.flush()
             if resolution_timestamp is None:
                 resolution_timestamp = datetime.now().isoformat()
             
-            # Calculate prediction accuracy and calibration score
-            prediction = self.get_prediction(prediction_id)
-            if not prediction:
+            cursor = self._conn.cursor()
+            cursor.execute(
+                UPDATE_OUTCOME_SQL,
+                self._outcome_params(prediction_id, actual_outcome, realized_pnl, resolution_timestamp)
+            )
+            if cursor.rowcount == 0:
                 return False
-            
-            predicted_prob = prediction.predicted_probability
-            
-            # Calculate accuracy (Brier score - lower is better, so we invert it)
-            brier_score = (predicted_prob - (1.0 if actual_outcome else 0.0)) ** 2
-            accuracy = 1.0 - brier_score  # Convert to accuracy (higher is better)
-            
-            # Calculate calibration score (simplified)
-            calibration_score = self._calculate_calibration_score(predicted_prob, actual_outcome)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE predictions 
-                SET actual_outcome = ?, realized_pnl = ?, resolution_timestamp = ?,
-                    prediction_accuracy = ?, calibration_score = ?
-                WHERE prediction_id = ?
-            """, (
-                actual_outcome, realized_pnl, resolution_timestamp,
-                accuracy, calibration_score, prediction_id
-            ))
-            
-            conn.commit()
-            conn.close()
+            self._invalidate_metrics()
             
             print(f"Success: Updated prediction outcome: {prediction_id}")
             return True
@@ -256,22 +799,75 @@ class MemorySystem:
             print(f"Error: Failed to update prediction outcome: {e}")
             return False
     
+    def update_prediction_outcomes(
+        self,
+        outcomes: List[Tuple[str, bool, Optional[float]]],
+        resolution_timestamp: Optional[str] = None
+    ) -> int:
+        """
+        Record many (prediction_id, actual_outcome, realized_pnl) resolutions in one
+        transaction. Returns the number of predictions updated.
+        """
+        
+        try:
+            self.flush()
+            if resolution_timestamp is None:
+                resolution_timestamp = datetime.now().isoformat()
+            
+            params = [
+                self._outcome_params(prediction_id, actual_outcome, realized_pnl, resolution_timestamp)
+                for prediction_id, actual_outcome, realized_pnl in outcomes
+            ]
+            
+            conn = self._conn
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(UPDATE_OUTCOME_SQL, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self._invalidate_metrics()
+            
+            print(f"Success: Updated {cursor.rowcount} prediction outcomes")
+            return cursor.rowcount
+            
+        except Exception as e:
+            print(f"Error: Failed to update prediction outcomes: {e}")
+            return 0
+    
+    @staticmethod
+    def _outcome_params(
+        prediction_id: str,
+        actual_outcome: bool,
+        realized_pnl: Optional[float],
+        resolution_timestamp: str
+    ) -> Tuple:
+        """Bind parameters for UPDATE_OUTCOME_SQL."""
+        outcome_value = 1.0 if actual_outcome else 0.0
+        return (
+            actual_outcome, realized_pnl, resolution_timestamp,
+            outcome_value, outcome_value, bool(actual_outcome), prediction_id
+        )
+    
     def get_prediction(self, prediction_id: str) -> Optional[PredictionRecord]:
         """Retrieve a specific prediction by ID."""
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            self.flush()
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
-            cursor.execute("SELECT * FROM predictions WHERE prediction_id = ?", (prediction_id,))
+            cursor.execute(
+                f"SELECT {PREDICTION_ROW_COLUMNS} FROM predictions WHERE prediction_id = ?", (prediction_id,)
+            )
             row = cursor.fetchone()
-            conn.close()
             
             if row:
                 # Convert database row to PredictionRecord
                 data = dict(row)
-                data['metadata'] = json.loads(data['metadata'])
+                data['metadata'] = _loads_metadata(data['metadata'])
                 return PredictionRecord(**data)
             
             return None
@@ -285,98 +881,105 @@ class MemorySystem:
         days_back: int = 30,
         category: Optional[str] = None
     ) -> PerformanceMetrics:
-        """Calculate comprehensive performance metrics."""
+        """Calculate comprehensive performance metrics, cached per window until the next write."""
+        
+        self.flush()
+        key = (days_back, category, self._write_epoch)
+        cached = self._metrics_cache.get(key)
+        if cached is not None and time.time() - cached[0] <= METRICS_CACHE_TTL_SECONDS:
+            return cached[1].model_copy(deep=True)
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Build query with optional category filter
-            query = """
-                SELECT * FROM predictions 
-                WHERE prediction_timestamp >= ? 
-            """
-            params = [(datetime.now() - timedelta(days=days_back)).isoformat()]
-            
-            if category:
-                query += " AND market_category = ?"
-                params.append(category)
-            
-            cursor.execute(query, params)
-            predictions = cursor.fetchall()
-            conn.close()
-            
-            if not predictions:
-                return self._empty_performance_metrics()
-            
-            # Calculate metrics
-            total_predictions = len(predictions)
-            resolved_predictions = len([p for p in predictions if p['actual_outcome'] is not None])
-            
-            if resolved_predictions == 0:
-                return self._empty_performance_metrics()
-            
-            resolved = [p for p in predictions if p['actual_outcome'] is not None]
-            
-            # Accuracy rate
-            accurate_predictions = [p for p in resolved if p['prediction_accuracy'] and p['prediction_accuracy'] > 0.5]
-            accuracy_rate = len(accurate_predictions) / resolved_predictions
-            
-            # Calibration score
-            calibration_scores = [p['calibration_score'] for p in resolved if p['calibration_score'] is not None]
-            avg_calibration = statistics.mean(calibration_scores) if calibration_scores else 0.0
-            
-            # Financial metrics
-            pnl_values = [p['realized_pnl'] for p in resolved if p['realized_pnl'] is not None]
-            total_pnl = sum(pnl_values)
-            
-            # Win rate
-            wins = len([pnl for pnl in pnl_values if pnl > 0])
-            win_rate = wins / len(pnl_values) if pnl_values else 0.0
-            
-            # Average position size
-            position_sizes = [p['position_size'] for p in predictions]
-            avg_position_size = statistics.mean(position_sizes) if position_sizes else 0.0
-            
-            # Calculate Sharpe ratio (simplified)
-            if len(pnl_values) > 1:
-                returns = np.array(pnl_values)
-                sharpe_ratio = np.mean(returns) / np.std(returns) if np.std(returns) > 0 else 0.0
-            else:
-                sharpe_ratio = 0.0
-            
-            # Max drawdown (simplified)
-            cumulative_pnl = np.cumsum(pnl_values) if pnl_values else [0]
-            running_max = np.maximum.accumulate(cumulative_pnl)
-            drawdowns = running_max - cumulative_pnl
-            max_drawdown = np.max(drawdowns) if len(drawdowns) > 0 else 0.0
-            
-            # Category performance
-            category_performance = self._analyze_category_performance(predictions)
-            
-            # Confidence calibration
-            confidence_calibration = self._calculate_confidence_calibration(resolved)
-            
-            return PerformanceMetrics(
-                total_predictions=total_predictions,
-                resolved_predictions=resolved_predictions,
-                accuracy_rate=accuracy_rate,
-                average_calibration_score=avg_calibration,
-                total_realized_pnl=total_pnl,
-                roi=total_pnl / 1000.0,  # Assume 1000 starting bankroll
-                sharpe_ratio=sharpe_ratio,
-                max_drawdown=max_drawdown,
-                win_rate=win_rate,
-                average_position_size=avg_position_size,
-                best_performing_category=category_performance['best'],
-                worst_performing_category=category_performance['worst'],
-                confidence_calibration=confidence_calibration
-            )
-            
+            metrics = self._compute_metrics(days_back, category)
         except Exception as e:
             print(f"Error: Failed to calculate performance metrics: {e}")
             return self._empty_performance_metrics()
+        
+        if len(self._metrics_cache) >= METRICS_CACHE_MAX_ENTRIES:
+            self._metrics_cache.clear()
+        self._metrics_cache[key] = (time.time(), metrics)
+        return metrics.model_copy(deep=True)
+    
+    def _compute_metrics(self, days_back: int, category: Optional[str]) -> PerformanceMetrics:
+        """Run the metric queries for one window (uncached)."""
+        
+        cursor = self._conn.cursor()
+        
+        # Window filter with optional category
+        cutoff_ns = _timestamp_ns(datetime.now() - timedelta(days=days_back))
+        where = "prediction_ts_ns >= ?"
+        params = [cutoff_ns]
+        
+        if category:
+            where += " AND market_category = ?"
+            params.append(category)
+        
+        # Counts and averages from the daily rollup (plus raw rows of the partial first day)
+        window_sql, window_params = self._metrics_window(cutoff_ns, category)
+        cursor.execute(f"""
+            SELECT SUM(n), SUM(n_resolved), SUM(n_accurate), SUM(n_cal), SUM(sum_cal),
+                   SUM(n_pnl), SUM(sum_pnl), SUM(wins), SUM(sum_pos)
+            FROM ({window_sql})
+        """, window_params)
+        (total_predictions, resolved_predictions, accurate_count, calibration_count, calibration_sum,
+         pnl_count, total_pnl, wins, position_sum) = cursor.fetchone()
+        
+        if not total_predictions or not resolved_predictions:
+            return self._empty_performance_metrics()
+        
+        accuracy_rate = accurate_count / resolved_predictions
+        avg_calibration = calibration_sum / calibration_count if calibration_count else 0.0
+        win_rate = wins / pnl_count if pnl_count else 0.0
+        avg_position_size = position_sum / total_predictions
+        
+        # Sharpe ratio and max drawdown (simplified). Both are 0 with fewer than two PnL
+        # values, so the series is only read when the rollup counts at least two
+        sharpe_ratio = 0.0
+        max_drawdown = 0.0
+        if pnl_count > 1:
+            # Resolved PnL series in chronological order. Max drawdown depends on this order:
+            # the original unordered query walked rows in table (insertion) order, which is
+            # kept as the tie-break for predictions with the same timestamp
+            cursor.execute(f"""
+                SELECT realized_pnl
+                FROM predictions
+                WHERE {where} AND actual_outcome IS NOT NULL AND realized_pnl IS NOT NULL
+                ORDER BY prediction_ts_ns, prediction_rowid
+            """, params)
+            pnl = np.fromiter((row[0] for row in cursor), dtype=np.float64)
+            
+            if _pnl_stats_jit is not None and pnl.size > PNL_STATS_JIT_MIN_SIZE:
+                mean, std, max_drawdown = _pnl_stats_jit(pnl)
+            elif pnl.size:
+                mean, std = pnl.mean(), pnl.std()
+                cumulative_pnl = np.cumsum(pnl)
+                max_drawdown = (np.maximum.accumulate(cumulative_pnl) - cumulative_pnl).max()
+            else:
+                mean, std = 0.0, 0.0
+            if pnl.size > 1 and std > 0:
+                sharpe_ratio = mean / std
+        
+        # Category performance
+        category_performance = self._analyze_category_performance(window_sql, window_params)
+        
+        # Confidence calibration
+        confidence_calibration = self._calculate_confidence_calibration(where, params)
+        
+        return PerformanceMetrics(
+            total_predictions=total_predictions,
+            resolved_predictions=resolved_predictions,
+            accuracy_rate=accuracy_rate,
+            average_calibration_score=avg_calibration,
+            total_realized_pnl=total_pnl,
+            roi=total_pnl / 1000.0,  # Assume 1000 starting bankroll
+            sharpe_ratio=sharpe_ratio,
+            max_drawdown=max_drawdown,
+            win_rate=win_rate,
+            average_position_size=avg_position_size,
+            best_performing_category=category_performance['best'],
+            worst_performing_category=category_performance['worst'],
+            confidence_calibration=confidence_calibration
+        )
     
     def learn_from_performance(self) -> List[LearningInsight]:
         """Analyze performance and generate learning insights."""
@@ -411,8 +1014,8 @@ class MemorySystem:
                 insights.append(timing_insight)
             
             # Store insights in database
-            for insight in insights:
-                self._store_learning_insight(insight)
+            if insights:
+                self._store_learning_insights(insights)
             
             print(f"Generated {len(insights)} learning insights")
             
@@ -427,18 +1030,16 @@ class MemorySystem:
         patterns = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            self.flush()
+            cursor = self._conn.cursor()
             
             # Get all resolved predictions
-            cursor.execute("""
-                SELECT * FROM predictions 
+            cursor.execute(f"""
+                SELECT {PREDICTION_ROW_COLUMNS} FROM predictions 
                 WHERE actual_outcome IS NOT NULL 
                 ORDER BY prediction_timestamp
             """)
-            predictions = cursor.fetchall()
-            conn.close()
+            predictions = [PredictionRow(*row) for row in cursor]
             
             if len(predictions) < self.pattern_detection_threshold:
                 return patterns
@@ -498,9 +1099,10 @@ class MemorySystem:
             
             # Market-specific recommendations
             similar_predictions = self._find_similar_predictions(market_question, market_category)
-            if similar_predictions:
-                avg_accuracy = statistics.mean([p.prediction_accuracy for p in similar_predictions 
-                                              if p.prediction_accuracy is not None])
+            similar_accuracies = [p.prediction_accuracy for p in similar_predictions
+                                  if p.prediction_accuracy is not None]
+            if similar_accuracies:
+                avg_accuracy = np.mean(similar_accuracies)
                 if avg_accuracy < 0.5:
                     recommendations.append("Similar questions have performed poorly - increase research depth")
             
@@ -511,14 +1113,6 @@ class MemorySystem:
     
     # Helper methods
     
-    def _calculate_calibration_score(self, predicted_prob: float, actual_outcome: bool) -> float:
-        """Calculate calibration score for a single prediction."""
-        # Simplified calibration score
-        if actual_outcome:
-            return predicted_prob  # Higher predicted probability is better for positive outcomes
-        else:
-            return 1.0 - predicted_prob  # Lower predicted probability is better for negative outcomes
-    
     def _empty_performance_metrics(self) -> PerformanceMetrics:
         """Return empty performance metrics."""
         return PerformanceMetrics(
@@ -537,43 +1131,67 @@ class MemorySystem:
             confidence_calibration={}
         )
     
-    def _analyze_category_performance(self, predictions: List) -> Dict[str, str]:
-        """Analyze performance by category."""
-        category_pnl = {}
+    @staticmethod
+    def _metrics_window(cutoff_ns: int, category: Optional[str]) -> Tuple[str, List]:
+        """
+        Subquery yielding daily_metrics-shaped rows for predictions at or after cutoff_ns:
+        rollup rows for whole days after the cutoff's day, raw rows for the rest of that day.
+        """
+        cutoff_day = cutoff_ns // DAY_NS
+        rollup_filter = raw_filter = ""
+        rollup_params: List = [cutoff_day]
+        raw_params: List = [cutoff_ns, (cutoff_day + 1) * DAY_NS]
+        if category:
+            rollup_filter = " AND category = ?"
+            raw_filter = " AND market_category = ?"
+            rollup_params.append(category)
+            raw_params.append(category)
         
-        for pred in predictions:
-            if pred['realized_pnl'] is not None:
-                category = pred['market_category']
-                if category not in category_pnl:
-                    category_pnl[category] = []
-                category_pnl[category].append(pred['realized_pnl'])
+        columns = ", ".join(DAILY_METRICS_COLUMNS)
+        terms = ", ".join(
+            f"{term} AS {column}" for term, column in zip(_daily_metrics_terms(""), DAILY_METRICS_COLUMNS)
+        )
+        sql = f"""
+            SELECT category, {columns} FROM daily_metrics
+            WHERE day > ?{rollup_filter}
+            UNION ALL
+            SELECT market_category AS category, {terms} FROM predictions
+            WHERE prediction_ts_ns >= ? AND prediction_ts_ns < ?{raw_filter}
+        """
+        return sql, rollup_params + raw_params
+    
+    def _analyze_category_performance(self, window_sql: str, window_params: List) -> Dict[str, str]:
+        """Analyze performance by category (average realized PnL) over a metrics window."""
+        cursor = self._conn.cursor()
+        cursor.execute(f"""
+            SELECT category, SUM(sum_pnl) / SUM(n_pnl)
+            FROM ({window_sql})
+            GROUP BY category
+            HAVING SUM(n_pnl) > 0
+        """, window_params)
+        category_avg = cursor.fetchall()
         
-        if not category_pnl:
+        if not category_avg:
             return {"best": "none", "worst": "none"}
         
-        category_avg = {cat: statistics.mean(pnls) for cat, pnls in category_pnl.items()}
-        
-        best = max(category_avg.items(), key=lambda x: x[1])[0]
-        worst = min(category_avg.items(), key=lambda x: x[1])[0]
+        best = max(category_avg, key=lambda x: x[1])[0]
+        worst = min(category_avg, key=lambda x: x[1])[0]
         
         return {"best": best, "worst": worst}
     
-    def _calculate_confidence_calibration(self, predictions: List) -> Dict[str, float]:
-        """Calculate calibration by confidence level."""
-        confidence_groups = {"low": [], "medium": [], "high": []}
-        
-        for pred in predictions:
-            if pred['prediction_accuracy'] is not None:
-                confidence_level = pred['confidence_level']
-                if confidence_level in confidence_groups:
-                    confidence_groups[confidence_level].append(pred['prediction_accuracy'])
+    def _calculate_confidence_calibration(self, where: str, params: List) -> Dict[str, float]:
+        """Calculate calibration by confidence level over resolved predictions matching the filter."""
+        cursor = self._conn.cursor()
+        cursor.execute(f"""
+            SELECT confidence_level, AVG(prediction_accuracy)
+            FROM predictions
+            WHERE {where} AND actual_outcome IS NOT NULL AND prediction_accuracy IS NOT NULL
+                AND confidence_level IN ('low', 'medium', 'high')
+            GROUP BY confidence_level
+        """, params)
+        level_accuracy = dict(cursor.fetchall())
         
-        calibration = {}
-        for level, accuracies in confidence_groups.items():
-            if accuracies:
-                calibration[level] = statistics.mean(accuracies)
-        
-        return calibration
+        return {level: level_accuracy[level] for level in ("low", "medium", "high") if level in level_accuracy}
     
     def _analyze_overconfidence(self) -> Optional[LearningInsight]:
         """Analyze if the system is overconfident."""
@@ -599,36 +1217,46 @@ class MemorySystem:
         """Analyze market timing patterns."""
         return None  # Simplified - would implement real analysis
     
-    def _store_learning_insight(self, insight: LearningInsight) -> bool:
-        """Store a learning insight in the database."""
+    def _store_learning_insights(self, insights: List[LearningInsight]) -> bool:
+        """Store learning insights in the database in one transaction."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            now = datetime.now()
+            created_timestamp = now.isoformat()
+            id_prefix = f"insight_{now.strftime('%Y%m%d_%H%M%S')}"
+            
+            # uuid suffix keeps same-second runs from overwriting each other
+            rows = [
+                (
+                    f"{id_prefix}_{insight.insight_type}_{uuid.uuid4().hex[:12]}",
+                    insight.insight_type,
+                    insight.description,
+                    insight.confidence,
+                    insight.recommendation,
+                    insight.impact_score,
+                    created_timestamp,
+                    _dumps_metadata({"supporting_evidence": insight.supporting_evidence})
+                )
+                for insight in insights
+            ]
+            
+            conn = self._conn
             cursor = conn.cursor()
-            
-            insight_id = f"insight_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{insight.insight_type}"
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO learning_insights (
-                    insight_id, insight_type, description, confidence,
-                    recommendation, impact_score, created_timestamp, metadata
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                insight_id,
-                insight.insight_type,
-                insight.description,
-                insight.confidence,
-                insight.recommendation,
-                insight.impact_score,
-                datetime.now().isoformat(),
-                json.dumps({"supporting_evidence": insight.supporting_evidence})
-            ))
-            
-            conn.commit()
-            conn.close()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO learning_insights (
+                        insight_id, insight_type, description, confidence,
+                        recommendation, impact_score, created_timestamp, metadata
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
             return True
             
         except Exception as e:
-            print(f"Error: Failed to store learning insight: {e}")
+            print(f"Error: Failed to store learning insights: {e}")
             return False
     
     def get_recent_learning_insights(self, days_back: int = 30) -> List[LearningInsight]:
@@ -636,28 +1264,23 @@ class MemorySystem:
         insights = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            cursor = self._conn.cursor()
             
             cursor.execute("""
-                SELECT * FROM learning_insights 
+                SELECT insight_type, description, confidence, recommendation, impact_score, metadata
+                FROM learning_insights 
                 WHERE created_timestamp >= ?
                 ORDER BY impact_score DESC
             """, [(datetime.now() - timedelta(days=days_back)).isoformat()])
             
-            rows = cursor.fetchall()
-            conn.close()
-            
-            for row in rows:
-                metadata = json.loads(row['metadata'])
+            for insight_type, description, confidence, recommendation, impact_score, metadata in cursor:
                 insights.append(LearningInsight(
-                    insight_type=row['insight_type'],
-                    description=row['description'],
-                    confidence=row['confidence'],
-                    supporting_evidence=metadata.get('supporting_evidence', []),
-                    recommendation=row['recommendation'],
-                    impact_score=row['impact_score']
+                    insight_type=insight_type,
+                    description=description,
+                    confidence=confidence,
+                    supporting_evidence=_loads_metadata(metadata).get('supporting_evidence', []),
+                    recommendation=recommendation,
+                    impact_score=impact_score
                 ))
                 
         except Exception as e:
@@ -665,30 +1288,27 @@ class MemorySystem:
         
         return insights
     
-    def _find_similar_predictions(self, market_question: str, category: str) -> List[PredictionRecord]:
-        """Find similar historical predictions."""
-        # Simplified similarity matching
+    def _find_similar_predictions(self, market_question: str, category: str) -> List[PredictionRow]:
+        """Find resolved predictions in the category whose questions best match (BM25)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM predictions 
-                WHERE market_category = ? AND actual_outcome IS NOT NULL
+            # Quote each word so user text cannot inject FTS5 query syntax
+            terms = " OR ".join(f'"{word}"' for word in dict.fromkeys(re.findall(r"\w+", market_question.lower())))
+            if not terms:
+                return []
+            
+            self.flush()
+            cursor = self._conn.cursor()
+            
+            cursor.execute(f"""
+                SELECT {FTS_PREDICTION_ROW_COLUMNS}
+                FROM predictions_fts f
+                JOIN predictions p ON p.prediction_rowid = f.rowid
+                WHERE predictions_fts MATCH ? AND p.market_category = ? AND p.actual_outcome IS NOT NULL
+                ORDER BY bm25(predictions_fts)
                 LIMIT 10
-            """, (category,))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            predictions = []
-            for row in rows:
-                data = dict(row)
-                data['metadata'] = json.loads(data['metadata'])
-                predictions.append(PredictionRecord(**data))
+            """, (terms, category))
             
-            return predictions
+            return [PredictionRow(*row) for row in cursor]
             
         except Exception as e:
             print(f"Error: Failed to find similar predictions: {e}")
@@ -696,19 +1316,19 @@ class MemorySystem:
     
     # Pattern detection helper methods (simplified implementations)
     
-    def _detect_confidence_pattern(self, predictions: List) -> Optional[MarketPattern]:
+    def _detect_confidence_pattern(self, predictions: List[PredictionRow]) -> Optional[MarketPattern]:
         """Detect patterns in high confidence predictions."""
         return None  # Simplified - would implement real pattern detection
     
-    def _detect_category_patterns(self, predictions: List) -> List[MarketPattern]:
+    def _detect_category_patterns(self, predictions: List[PredictionRow]) -> List[MarketPattern]:
         """Detect category-specific patterns."""
         return []  # Simplified - would implement real pattern detection
     
-    def _detect_sizing_patterns(self, predictions: List) -> Optional[MarketPattern]:
+    def _detect_sizing_patterns(self, predictions: List[PredictionRow]) -> Optional[MarketPattern]:
         """Detect position sizing patterns."""
         return None  # Simplified - would implement real pattern detection
     
-    def _detect_time_patterns(self, predictions: List) -> List[MarketPattern]:
+    def _detect_time_patterns(self, predictions: List[PredictionRow]) -> List[MarketPattern]:
         """Detect time-based patterns."""
         return []  # Simplified - would implement real pattern detection
 
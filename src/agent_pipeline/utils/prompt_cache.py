@@ -0,0 +1,85 @@
+"""
+Prompt cache for agent runs to skip repeated LLM round trips.
+"""
+
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from agents import Agent, Runner
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    """
+    In-memory cache of agent outputs keyed by agent and normalized prompt.
+    Only exact matches (after normalization) are served: near-identical prompts can
+    differ in exactly the token that matters (a year, "not", word order).
+    """
+
+    def __init__(self, default_ttl_seconds: int = 1800, max_entries: int = 256):
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.default_ttl = default_ttl_seconds
+        self.max_entries = max_entries
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Collapse case and whitespace so trivial prompt variations share a key."""
+        return " ".join(text.lower().split())
+
+    def _make_key(self, agent: Agent, normalized: str) -> str:
+        """Create a cache key from the agent identity and normalized prompt."""
+        key_string = f"{agent.name}\x00{agent.instructions}\x00{normalized}"
+        return hashlib.md5(key_string.encode()).hexdigest()
+
+    def get(self, agent: Agent, key_text: str) -> Optional[Any]:
+        """Get a cached output for this agent and prompt if available and not expired."""
+        entry = self.cache.get(self._make_key(agent, self._normalize(key_text)))
+        if entry is not None and time.time() <= entry['expires_at']:
+            logger.debug(f"Prompt cache hit for {agent.name}")
+            return entry['output']
+        return None
+
+    def set(self, agent: Agent, key_text: str, output: Any, ttl_seconds: Optional[int] = None):
+        """Store an agent output with TTL, evicting the oldest entry when full."""
+        normalized = self._normalize(key_text)
+        ttl = ttl_seconds or self.default_ttl
+
+        if len(self.cache) >= self.max_entries:
+            self.cache.pop(next(iter(self.cache)))
+
+        self.cache[self._make_key(agent, normalized)] = {
+            'output': output,
+            'expires_at': time.time() + ttl
+        }
+
+    async def get_or_run(
+        self,
+        agent: Agent,
+        prompt: str,
+        key_text: Optional[str] = None
+    ) -> Any:
+        """
+        Return the cached output for this prompt or run the agent and cache it.
+
+        key_text lets callers leave volatile content (e.g. timestamps) out of the key.
+        """
+        key_text = prompt if key_text is None else key_text
+
+        cached_output = self.get(agent, key_text)
+        if cached_output is not None:
+            return cached_output
+
+        result = await Runner.run(agent, input=prompt)
+        self.set(agent, key_text, result.final_output)
+        return result.final_output
+
+    def clear(self):
+        """Clear all cached outputs."""
+        self.cache.clear()
+
+
+# Global prompt cache instance
+prompt_cache = PromptCache()
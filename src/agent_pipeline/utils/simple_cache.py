@@ -2,90 +2,182 @@
 Simple cache system for API calls to improve efficiency.
 """
 
+import asyncio
 import hashlib
-import json
+import heapq
+import logging
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import xxhash
+except ImportError:  # Optional faster key hashing
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+# Calls with a sized argument longer than this are not cached (keying them would cost more than it saves)
+CACHE_KEY_MAX_ARG_LEN = 100_000
+
+
+_UNCACHEABLE = object()
+_MISS = object()  # get_by_key result when there is no live entry (None is a valid cached value)
+
+
+class _ErrorMarker:
+    """Cached stand-in for a failed call, re-raised on hits until it expires."""
+    __slots__ = ('error',)
+    
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+# One-shot 128-bit hash of the key bytes (no hasher object per call)
+if xxhash is not None:
+    _hash_key = xxhash.xxh3_128_intdigest
+else:
+    def _hash_key(data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), 'big')
 
 
 class SimpleCache:
     """
     Simple in-memory cache with TTL (time-to-live).
     Follows Anthropic's "start simple" principle.
+    Bounded to max_entries; the least recently used entry is evicted first.
+    
+    Thread-safe: reads are a lock-free dict.get (atomic under the GIL) and writes
+    take a short lock. A reader racing a writer may see the previous value or miss,
+    which is acceptable for a cache.
     """
     
-    def __init__(self, default_ttl_seconds: int = 3600):  # 1 hour default
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, default_ttl_seconds: int = 3600, max_entries: int = 10_000):  # 1 hour default
+        # key -> (result, monotonic expiry), ordered from least to most recently used
+        self.cache: OrderedDict[int, Tuple[Any, float]] = OrderedDict()
         self.default_ttl = default_ttl_seconds
+        self.max_entries = max_entries
+        # (expiry, key) min-heap; stale pairs (overwritten or evicted keys) are skipped on pop
+        self._expiry_heap: List[Tuple[float, int]] = []
+        # (event loop, key) -> future of the call currently computing it (used by cached())
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, int], asyncio.Future] = {}
+        self._write_lock = threading.Lock()
     
-    def _make_key(self, function_name: str, *args, **kwargs) -> str:
-        """Create a cache key from function name and arguments."""
-        # Create a stable hash from function name and arguments
-        key_data = {
-            'function': function_name,
-            'args': args,
-            'kwargs': kwargs
-        }
-        key_string = json.dumps(key_data, sort_keys=True, default=str)
-        return hashlib.md5(key_string.encode()).hexdigest()
+    @staticmethod
+    def _key_part(value: Any) -> Any:
+        """
+        Stand-in for an argument in the cache key, or _UNCACHEABLE.
+        Objects can define __cache_key__() to supply a cheap key instead of their repr.
+        """
+        key_fn = getattr(type(value), '__cache_key__', None)
+        if key_fn is not None:
+            return key_fn(value)
+        try:
+            if len(value) > CACHE_KEY_MAX_ARG_LEN:
+                return _UNCACHEABLE
+        except TypeError:  # Not sized
+            pass
+        return value
     
-    def get(self, function_name: str, *args, **kwargs) -> Optional[Any]:
-        """Get cached result if available and not expired."""
-        cache_key = self._make_key(function_name, *args, **kwargs)
+    def _make_key(self, function_name: str, *args, **kwargs) -> Optional[int]:
+        """Create a cache key from function name and arguments, or None if the call shouldn't be cached."""
+        key_args = tuple(map(self._key_part, args))
+        key_kwargs = sorted((name, self._key_part(value)) for name, value in kwargs.items())
+        if any(part is _UNCACHEABLE for part in key_args) or any(part is _UNCACHEABLE for _, part in key_kwargs):
+            return None
         
-        if cache_key not in self.cache:
+        # Hash the repr of the call; kwargs are sorted so their order doesn't matter
+        return _hash_key(repr((function_name, key_args, key_kwargs)).encode())
+    
+    def get(self, function_name: str, *args, **kwargs) -> Optional[Any]:
+        """Get cached result if available and not expired (None on a miss or a cached error)."""
+        result = self.get_by_key(self._make_key(function_name, *args, **kwargs))
+        if result is _MISS or type(result) is _ErrorMarker:
             return None
+        print(f"🔄 Cache hit for {function_name}")
+        return result
+    
+    def get_by_key(self, cache_key: Optional[int]) -> Any:
+        """Get cached result for a key from _make_key if available and not expired, else _MISS."""
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            return _MISS
         
-        cached_data = self.cache[cache_key]
+        result, expires_at = entry
         
         # Check if expired
-        if time.time() > cached_data['expires_at']:
-            del self.cache[cache_key]
-            return None
+        if time.monotonic() > expires_at:
+            with self._write_lock:
+                # Only drop the entry we saw, not one another thread just stored
+                if self.cache.get(cache_key) is entry:
+                    del self.cache[cache_key]
+            return _MISS
         
-        print(f"🔄 Cache hit for {function_name}")
-        return cached_data['result']
+        try:
+            self.cache.move_to_end(cache_key)
+        except KeyError:  # Evicted by another thread since the lookup
+            pass
+        return result
     
     def set(self, function_name: str, result: Any, ttl_seconds: Optional[int] = None, *args, **kwargs):
         """Store result in cache with TTL."""
         cache_key = self._make_key(function_name, *args, **kwargs)
+        if cache_key is None:
+            return
+        ttl = self.set_by_key(cache_key, result, ttl_seconds)
+        logger.info(f"Cached result for {function_name} (TTL: {ttl}s)")
+    
+    def set_by_key(self, cache_key: int, result: Any, ttl_seconds: Optional[int] = None) -> int:
+        """Store result under a key from _make_key, evicting LRU entries when full. Returns the TTL used."""
         ttl = ttl_seconds or self.default_ttl
         
-        self.cache[cache_key] = {
-            'result': result,
-            'expires_at': time.time() + ttl,
-            'created_at': time.time()
-        }
+        expires_at = time.monotonic() + ttl
         
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"Cached result for {function_name} (TTL: {ttl}s)")
+        with self._write_lock:
+            self.cache[cache_key] = (result, expires_at)
+            self.cache.move_to_end(cache_key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+            
+            heapq.heappush(self._expiry_heap, (expires_at, cache_key))
+            if len(self._expiry_heap) > 2 * self.max_entries:
+                # Drop stale pairs so the heap stays proportional to the cache.
+                # list() snapshots in one C call, so concurrent move_to_end can't break the iteration.
+                self._expiry_heap = [(exp, key) for key, (_, exp) in list(self.cache.items())]
+                heapq.heapify(self._expiry_heap)
+        return ttl
     
     def clear(self):
         """Clear all cached data."""
-        self.cache.clear()
+        with self._write_lock:
+            self.cache.clear()
+            self._expiry_heap.clear()
         print("🧹 Cache cleared")
     
     def cleanup_expired(self):
-        """Remove expired entries."""
-        current_time = time.time()
-        expired_keys = [
-            key for key, data in self.cache.items()
-            if current_time > data['expires_at']
-        ]
+        """Remove expired entries (cost scales with the number expired, not the cache size)."""
+        current_time = time.monotonic()
+        removed = 0
         
-        for key in expired_keys:
-            del self.cache[key]
+        with self._write_lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] < current_time:
+                expires_at, key = heapq.heappop(heap)
+                entry = self.cache.get(key)
+                if entry is not None and entry[1] == expires_at:
+                    del self.cache[key]
+                    removed += 1
         
-        if expired_keys:
-            print(f"🧹 Cleaned up {len(expired_keys)} expired cache entries")
+        if removed:
+            print(f"🧹 Cleaned up {removed} expired cache entries")
     
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
         self.cleanup_expired()
         return {
             'total_entries': len(self.cache),
-            'cache_size_mb': len(str(self.cache)) / (1024 * 1024)
+            'max_entries': self.max_entries
         }
 
 
@@ -93,9 +185,12 @@ class SimpleCache:
 cache = SimpleCache()
 
 
-def cached(ttl_seconds: int = 3600):
+def cached(ttl_seconds: int = 3600, negative_ttl_seconds: Optional[int] = None):
     """
     Simple decorator to cache function results.
+    Concurrent calls with the same arguments share a single execution.
+    With negative_ttl_seconds, a raised exception is cached for that long and
+    re-raised to identical calls instead of hitting a failing upstream again.
     
     Usage:
     @cached(ttl_seconds=1800)  # 30 minutes
@@ -103,15 +198,59 @@ def cached(ttl_seconds: int = 3600):
         return await some_api_call(param)
     """
     def decorator(func):
+        name = func.__name__
+        
         async def wrapper(*args, **kwargs):
-            # Check cache first
-            cached_result = cache.get(func.__name__, *args, **kwargs)
-            if cached_result is not None:
-                return cached_result
+            # Key is computed once and shared by the lookup and the store
+            key = cache._make_key(name, *args, **kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+            # In-flight calls are tracked per event loop: a future can only be awaited on its own loop.
+            # No asyncio.Lock is needed, nothing awaits between the map lookup and the insert below.
+            inflight_key = (asyncio.get_running_loop(), key)
+            
+            while True:
+                # Check cache first
+                cached_result = cache.get_by_key(key)
+                if cached_result is not _MISS:
+                    print(f"🔄 Cache hit for {name}")
+                    if type(cached_result) is _ErrorMarker:
+                        raise cached_result.error.with_traceback(None)
+                    return cached_result
+                
+                pending = cache._inflight.get(inflight_key)
+                if pending is None:
+                    break
+                
+                # Same call already running: wait for its outcome instead of repeating it.
+                # shield() keeps a cancelled waiter from cancelling the shared future.
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                    # The running call was cancelled; retry and run it ourselves
             
             # Execute function and cache result
-            result = await func(*args, **kwargs)
-            cache.set(func.__name__, result, ttl_seconds, *args, **kwargs)
+            future = inflight_key[0].create_future()
+            cache._inflight[inflight_key] = future
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved so asyncio doesn't log it when nobody waited
+                if negative_ttl_seconds and isinstance(e, Exception):
+                    cache.set_by_key(key, _ErrorMarker(e), negative_ttl_seconds)
+                raise
+            finally:
+                cache._inflight.pop(inflight_key, None)
+            
+            future.set_result(result)
+            ttl = cache.set_by_key(key, result, ttl_seconds)
+            logger.info(f"Cached result for {name} (TTL: {ttl}s)")
             
             return result
         
@@ -4,22 +4,43 @@ Simple utilities for better error handling and timeouts.
 
 import asyncio
 import functools
-from typing import Any, Callable, Optional
+import random
+import sys
+from typing import Any, Callable, Optional, Tuple, Type
 
 
 async def with_timeout(coro, timeout_seconds: int = 60, error_message: str = "Operation timed out"):
     """
     Simple timeout wrapper for async operations.
+    
+    On Python 3.11+ the coroutine runs in the current task under asyncio.timeout()
+    (no extra Task, and context variables it sets stay visible to the caller).
     """
+    if sys.version_info < (3, 11):
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{error_message} (after {timeout_seconds}s)")
+    
     try:
-        return await asyncio.wait_for(coro, timeout=timeout_seconds)
-    except asyncio.TimeoutError:
+        async with asyncio.timeout(timeout_seconds):
+            return await coro
+    except TimeoutError:
         raise TimeoutError(f"{error_message} (after {timeout_seconds}s)")
 
 
-def retry_on_error(max_retries: int = 3, delay_seconds: float = 1.0):
+def retry_on_error(
+    max_retries: int = 3,
+    delay_seconds: float = 1.0,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+):
     """
     Simple retry decorator for functions that might fail.
+    
+    Backoff is exponential, capped at max_delay and jittered so callers that
+    failed together don't retry in lockstep. Only exceptions in retry_on are
+    retried; anything else propagates immediately.
     """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
@@ -29,11 +50,12 @@ def retry_on_error(max_retries: int = 3, delay_seconds: float = 1.0):
             for attempt in range(max_retries):
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
+                except retry_on as e:
                     last_error = e
                     if attempt < max_retries - 1:
                         print(f"Attempt {attempt + 1} failed for {func.__name__}: {e}")
-                        await asyncio.sleep(delay_seconds * (2 ** attempt))  # Exponential backoff
+                        backoff = min(max_delay, delay_seconds * (2 ** attempt))  # Exponential backoff
+                        await asyncio.sleep(random.uniform(0.5 * backoff, backoff))
                     else:
                         print(f"All {max_retries} attempts failed for {func.__name__}")
             